@@ -0,0 +1,115 @@
+"""
+runs the benchmarks, stores baselines and compares against them, e.g.:
+
+  python -m benchmarks run --size 100k --plans 1000
+  python -m benchmarks baseline --size 100k
+  python -m benchmarks compare --size 100k
+  python -m benchmarks run --size 100k --storage sqlite
+"""
+
+import json
+import logging
+import platform
+import sys
+
+from datetime import datetime
+from pathlib import Path
+
+from fintrack import __version__
+
+from benchmarks.suite import Suite, BENCHMARKS
+
+BASELINES = Path(__file__).parent / "baselines"
+
+# runs that are slower than the baseline by more than this factor are reported,
+# unless the difference is too small to be meaningful
+THRESHOLD  = 1.25
+MIN_SLOWER = 0.005
+
+class Benchmarks:
+  """
+  Fire-friendly front-end to the benchmark suite
+  """
+  def __init__(self, size="1k", plans="10", repeat=5, only=None, storage="files"):
+    self.size    = size
+    self.plans   = plans
+    self.repeat  = repeat
+    self.only    = [ only ] if isinstance(only, str) else only
+    self.storage = storage
+
+  @property
+  def names(self):
+    return list(BENCHMARKS)
+
+  def measure(self):
+    suite = Suite(size=self.size, plans=self.plans, storage=self.storage)
+    try:
+      return suite.run(names=self.only, repeat=self.repeat)
+    finally:
+      suite.cleanup()
+
+  def path(self):
+    storage = "" if self.storage == "files" else f"-{self.storage}"
+    return BASELINES / f"{self.size}-{self.plans}{storage}.json"
+
+  def run(self):
+    """
+    runs the benchmarks and reports their best time
+    """
+    for name, seconds in self.measure().items():
+      print(f"{name:<16} {seconds:10.4f}s")
+
+  def baseline(self):
+    """
+    runs the benchmarks and stores their timings as the baseline for this scale
+    """
+    results = self.measure()
+    BASELINES.mkdir(parents=True, exist_ok=True)
+    with self.path().open("w") as fp:
+      json.dump({
+        "version"  : __version__,
+        "python"   : platform.python_version(),
+        "machine"  : platform.machine(),
+        "created"  : datetime.now().isoformat(timespec="seconds"),
+        "results"  : results
+      }, fp, indent=2)
+    print(f"stored baseline in {self.path()}")
+
+  def compare(self, threshold=THRESHOLD):
+    """
+    runs the benchmarks and compares them to the baseline for this scale,
+    exiting with an error if any of them regressed beyond the threshold
+    """
+    try:
+      with self.path().open() as fp:
+        baseline = json.load(fp)
+    except FileNotFoundError:
+      print(f"no baseline for {self.size}-{self.plans}, create one using baseline")
+      sys.exit(2)
+
+    results     = self.measure()
+    regressions = []
+    print(f"comparing to baseline of version {baseline['version']} ({baseline['created']})")
+    print(f"{'benchmark':<16} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, seconds in results.items():
+      before = baseline["results"].get(name)
+      if before is None:
+        print(f"{name:<16} {'-':>10} {seconds:9.4f}s {'new':>7}")
+        continue
+      ratio = seconds / before if before else float("inf")
+      flag  = ""
+      if ratio > threshold and seconds - before > MIN_SLOWER:
+        flag = " <- regression"
+        regressions.append(name)
+      print(f"{name:<16} {before:9.4f}s {seconds:9.4f}s {ratio:6.2f}x{flag}")
+    if regressions:
+      print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+      sys.exit(1)
+
+def cli():
+  from fire import Fire
+  logging.disable(logging.WARNING) # keep the book from reporting on everything
+  Fire(Benchmarks, name="benchmarks")
+
+if __name__ == "__main__":
+  cli()
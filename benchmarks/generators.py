@@ -0,0 +1,79 @@
+"""
+generators of synthetic books, with records and plans, at any scale
+"""
+
+import random
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from fintrack.books   import Book
+from fintrack.records import Record
+from fintrack.plans   import PlannedRecord
+from fintrack.utils   import DECIMAL_POINT, DATE_ORDER
+
+DESCRIPTIONS = [
+  "groceries", "rent", "salary", "coffee", "insurance", "fuel", "restaurant",
+  "books", "electricity", "water", "internet", "phone", "savings", "gift"
+]
+
+SCHEDULES = [
+  "every day", "every week on friday", "every other week on monday",
+  "every month on the 1st", "every month on the 15th", "every year on june 7th"
+]
+
+# records are spread over the years before this moment
+END = datetime(2025, 1, 1)
+
+def records(count, seed=1, end=END):
+  """
+  generates count Records, ordered by timestamp, about 10 minutes apart
+  """
+  rnd   = random.Random(seed)
+  start = end - timedelta(minutes=10 * count)
+  for index in range(count):
+    yield Record(
+      Decimal(f"{rnd.randint(-50000, 50000)}E-2"),
+      rnd.choice(DESCRIPTIONS),
+      start + timedelta(minutes=10 * index, seconds=rnd.randint(0, 599)),
+      f"{seed}-{index}"
+    )
+
+def plans(count, seed=1):
+  """
+  generates count PlannedRecords, with a mix of recurring schedules
+  """
+  rnd = random.Random(seed)
+  for index in range(count):
+    yield PlannedRecord(
+      Decimal(f"{rnd.randint(-50000, 50000)}E-2"),
+      rnd.choice(DESCRIPTIONS),
+      rnd.choice(SCHEDULES),
+      uid=f"plan-{seed}-{index}"
+    )
+
+def lines(count, seed=2):
+  """
+  generates count tab separated lines, as consumed by Book.slurp
+  """
+  for record in records(count, seed=seed):
+    amount    = str(record.amount).replace(".", DECIMAL_POINT)
+    timestamp = record.timestamp.strftime(
+      "%m/%d/%Y %H:%M:%S" if DATE_ORDER.startswith("M") else "%d/%m/%Y %H:%M:%S"
+    )
+    yield f"{amount}\t{record.description}\t{timestamp}\n"
+
+def book(folder, records_count, plans_count=10, seed=1, storage="files"):
+  """
+  creates a book with records and plans in folder and returns it
+  """
+  folder = Path(folder)
+  if storage != "files":
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "config.yaml").write_text(f"storage: {storage}\n")
+  book = Book(folder, journal=False)
+  book._sheets["records"].update(records(records_count, seed=seed))
+  book._sheets["plans"].update(plans(plans_count, seed=seed))
+  book.save()
+  return book
@@ -0,0 +1,201 @@
+"""
+the benchmarks, timing the main operations on a synthetic book of some scale
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from io import StringIO
+from pathlib import Path
+
+from fintrack.books      import Book
+from fintrack.tracker    import Tracker
+
+from benchmarks import generators
+
+# number of records, by name
+SIZES = { "1k" : 1_000, "100k" : 100_000, "1M" : 1_000_000 }
+
+# number of plans, by name
+PLANS = { "10" : 10, "1000" : 1000 }
+
+BENCHMARKS = {}
+
+def benchmark(func):
+  """
+  registers a benchmark, which is called with a fresh copy of the book folder
+  and returns the operation to time
+  """
+  BENCHMARKS[func.__name__] = func
+  return func
+
+def count(value, options):
+  """
+  accepts the name of a scale, or a number
+  """
+  if isinstance(value, int):
+    return value
+  try:
+    return options[str(value)]
+  except KeyError:
+    raise ValueError(f"unknown scale: {value}, options: {list(options)}")
+
+class Suite:
+  """
+  generates a book with records and plans once, and times each benchmark on a
+  fresh copy of it, taking the best of a number of repeats
+  """
+  def __init__(self, size="1k", plans="10", seed=1, storage="files"):
+    self.size    = count(size, SIZES)
+    self.plans   = count(plans, PLANS)
+    self.seed    = seed
+    self.storage = storage
+    self._folder = None
+
+  @property
+  def folder(self):
+    if self._folder is None:
+      self._folder = Path(tempfile.mkdtemp(prefix="fintrack-bench-")) / "book"
+      generators.book(
+        self._folder, self.size, self.plans, seed=self.seed, storage=self.storage
+      )
+    return self._folder
+
+  def copy(self):
+    copy = Path(tempfile.mkdtemp(prefix="fintrack-bench-")) / "book"
+    shutil.copytree(self.folder, copy)
+    return copy
+
+  def run(self, names=None, repeat=3):
+    """
+    returns the best time in seconds for each (selected) benchmark
+    """
+    names = names or list(BENCHMARKS)
+    results = {}
+    for name in names:
+      if name not in BENCHMARKS:
+        raise ValueError(f"unknown benchmark: {name}, options: {list(BENCHMARKS)}")
+      timings = []
+      for _ in range(repeat):
+        folder    = self.copy()
+        operation = BENCHMARKS[name](folder, self)
+        started   = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - started)
+        shutil.rmtree(folder.parent, ignore_errors=True)
+      results[name] = min(timings)
+    return results
+
+  def cleanup(self):
+    if self._folder is not None:
+      shutil.rmtree(self._folder.parent, ignore_errors=True)
+      self._folder = None
+
+def loaded(folder, journal=True):
+  """
+  returns a book with its records and plans sheets loaded
+  """
+  book = Book(folder, journal=journal)
+  book._sheets["records"]
+  book._sheets["plans"]
+  return book
+
+@benchmark
+def load(folder, suite):
+  return lambda: loaded(folder)
+
+@benchmark
+def save(folder, suite):
+  book = loaded(folder)
+  book.sheet.add(-125, "benchmark") # only changed sheets are saved
+  return book.save
+
+@benchmark
+def add(folder, suite):
+  book = loaded(folder)
+  def operation():
+    for index in range(100):
+      book.add(-125, f"benchmark {index}")
+  return operation
+
+@benchmark
+def add_and_save(folder, suite):
+  book = loaded(folder, journal=False)
+  def operation():
+    for index in range(3):
+      book.add(-125, f"benchmark {index}")
+  return operation
+
+@benchmark
+def slurp(folder, suite):
+  book  = loaded(folder)
+  lines = list(generators.lines(max(suite.size // 10, 100), seed=suite.seed + 1))
+  return lambda: book.slurp(lines)
+
+@benchmark
+def take(folder, suite):
+  sheet = loaded(folder).sheet
+  first = sheet[0].timestamp
+  last  = sheet[-1].timestamp
+  steps = [ first + (last - first) * index / 100 for index in range(100) ]
+  def operation():
+    for start in steps:
+      list(sheet.take(100, start=start))
+  return operation
+
+@benchmark
+def scan(folder, suite):
+  book  = loaded(folder)
+  until = book.sheet[len(book.sheet) // 10].timestamp
+  return lambda: list(Book(folder).scan(until=until)) # only reads the first 10%
+
+@benchmark
+def future(folder, suite):
+  tracker = Tracker(folder)
+  tracker._book._sheets["plans"]
+  return lambda: list(tracker.future(until="in 1 year").current_sheet)
+
+@benchmark
+def future_cached(folder, suite):
+  list(Tracker(folder).future(until="in 1 year").current_sheet) # fills the cache
+  tracker = Tracker(folder)
+  tracker._book._sheets["plans"]
+  return lambda: list(tracker.future(until="in 1 year").current_sheet)
+
+@benchmark
+def future_parallel(folder, suite):
+  tracker = Tracker(folder)
+  plans   = tracker._book._sheets["plans"]
+  plans.workers  = min(os.cpu_count() or 1, 4)
+  plans.parallel = 0 # also with few plans, which are otherwise expanded serially
+  return lambda: list(tracker.future(until="in 1 year").current_sheet)
+
+@benchmark
+def overview(folder, suite):
+  tracker = Tracker(folder)
+  tracker._book._sheets["records"]
+  tracker._book._sheets["plans"]
+  return lambda: list(tracker.overview.current_sheet)
+
+@benchmark
+def balanced_rows(folder, suite):
+  sheet = loaded(folder).sheet
+  return lambda: list(sheet.balanced.rows)
+
+@benchmark
+def table(folder, suite):
+  tracker = Tracker(folder)
+  tracker._book._sheets["records"]
+  return lambda: tracker.table.stream(StringIO())
+
+@benchmark
+def table_tail(folder, suite):
+  tracker = Tracker(folder)
+  tracker._book._sheets["records"]
+  def operation():
+    table = tracker.balanced.table
+    table.tail = 50
+    table.stream(StringIO())
+  return operation
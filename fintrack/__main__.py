@@ -1,9 +1,8 @@
 # ruff: noqa: E402
 
-from fire import Fire
-
 import logging
 import os
+import sys
 
 # load the environment variables for this setup from .env file
 from dotenv import load_dotenv
@@ -33,12 +32,18 @@ for module in [
 
 
 from fintrack.tracker import Tracker
+from fintrack         import profiling
 
 def cli():
+  from fire import Fire # only imported when actually running the cli
+  # --profile(=<file>) enables profiling, it's not a command for Fire
+  args = profiling.from_args(sys.argv[1:])
   try:
-    Fire(Tracker(), name="fintrack")
+    Fire(Tracker(), command=args, name="fintrack")
   except KeyboardInterrupt:
     pass
+  finally:
+    profiling.profiler.finish()
 
 if __name__ == "__main__":
   cli()
@@ -1,10 +1,20 @@
 import sys
+import os
+import time
+
+import heapq
+import tempfile
+
+from itertools import islice
+from collections import Counter
+from contextlib import contextmanager
+from operator  import attrgetter
+from decimal import Decimal, InvalidOperation
 
 from dataclasses import dataclass
 
 from pathlib import Path
 
-import yaml
 import json
 
 from datetime import datetime
@@ -13,10 +23,21 @@ from sortedcontainers import SortedList
 
 from slugify import slugify
 
-from fintrack.records import Record
-from fintrack.plans   import PlannedRecord
-from fintrack.utils   import asrow, ClassEncoder, ClassDecoder, parse_datetime
-from fintrack.utils   import all_subclasses
+try:
+  import fcntl
+except ModuleNotFoundError: # e.g. on Windows, writers aren't locked out then
+  fcntl = None
+
+from fintrack.records import Record, CompactUid
+from fintrack.plans   import PlannedRecord, Occurrences
+from fintrack         import columnar
+from fintrack.reports import Report
+from fintrack.utils   import asrow, asrows, rawrows, humanized, ClassEncoder, ClassDecoder
+from fintrack.utils   import iterdecode
+from fintrack.utils   import parse_datetime, DECIMAL_CONTEXT
+from fintrack.utils   import all_subclasses, derived_uid
+
+from fintrack import profiling
 
 import logging
 logger = logging.getLogger(__name__)
@@ -27,23 +48,96 @@ DEFAULT_SHEETS = {
 }
 DEFAULT_SHEET = "records"
 
+# storage formats of sheet snapshots: format -> file suffix
+FORMATS = {
+  "json"     : "json",
+  "columnar" : "npz"
+}
+DEFAULT_FORMAT = "json"
+
+# storage backends: files (snapshots and journals per sheet) or a sqlite database
+STORAGES        = ( "files", "sqlite" )
+DEFAULT_STORAGE = "files"
+
+# size in bytes a sheet's journal can grow to before it is compacted
+JOURNAL_LIMIT = int(os.environ.get("JOURNAL_LIMIT", "1048576"))
+
+# number of worker processes that expand plans in parallel, 0 expands serially
+PLAN_WORKERS = int(os.environ.get("PLAN_WORKERS", "0"))
+
+# number of plans from which expanding them in parallel pays off
+PARALLEL_PLANS = int(os.environ.get("PARALLEL_PLANS", "200"))
+
+# number of lines that are parsed into records at once while slurping
+SLURP_BATCH = 10000
+
+# what to do with added records with a uid that is already known: add them
+# anyway, skip them or update the known record
+EXISTING = ( "add", "skip", "update" )
+
+# journal entries recording the removal of a record, by uid
+TOMBSTONE = b'{"removed": '
+
+def umask():
+  """
+  returns the current umask, which can only be read by setting it
+  """
+  mask = os.umask(0)
+  os.umask(mask)
+  return mask
+
+class Removal(str):
+  """
+  the uid of a removed record, as an entry of a journal
+  """
+
 class Book:
   """
   Following the analogy of a spreadsheet, a Book consists of several named
   sheets and provides access to them, along with persistence.
+
+  In journal mode, added records are appended to a per-sheet journal file,
+  instead of saving the entire book. Loading replays the journal on top of the
+  last saved snapshot of the sheet and once a journal grows beyond the journal
+  limit, it is compacted into a new snapshot.
+
+  Saving only writes the config and the sheets that changed since they were
+  loaded or last saved, each to a temporary file that then replaces the
+  previous version, so a crash never leaves a partially written file behind.
+
+  Several processes can write to the same folder: writers take a cooperative
+  lock on the folder and first merge in the records, by uid, that other
+  processes wrote since this book last looked. Readers don't take the lock.
+
+  Alternatively, with "storage: sqlite" in the config, all sheets are stored in
+  a single SQLite database, which they query and write through to themselves.
   """
   
-  def __init__(self, folder="~/.fintrack"):
-    self._sheets = {}     # all sheets by name: name -> sheet 
-
-    self._sheet  = None   # currently active sheet
-    self._folder = None   # storage location
+  def __init__(self, folder="~/.fintrack", journal=True, journal_limit=JOURNAL_LIMIT,
+                     workers=PLAN_WORKERS):
+    self._sheets = Sheets(self.load_sheet) # all sheets by name: name -> sheet
+
+    self._name    = None  # name of the currently active sheet
+    self._formats = {}    # non-default storage formats by name: name -> format
+    self._folder  = None  # storage location
+    self._stored  = None  # config as it was last loaded/saved, None if missing
+    self._saved   = {}    # version of sheets in their snapshot: name -> version
+    self._disk    = {}    # what was read: name -> (snapshot, journal, offset)
+    self._locks   = 0     # depth of (reentrant) locking of the folder
+    self._removed = {}    # uids of records this book removed: name -> uids
+    self._removals = {}   # what was read of the removals: name -> offset
+    self._storage  = DEFAULT_STORAGE
+    self._database = None # connection to the database of the sqlite storage
+
+    self.journal       = journal        # append added records to a journal
+    self.journal_limit = journal_limit  # size that triggers compaction
+    self.workers       = workers        # processes that expand plans
 
     self.folder  = folder # set the folder, using the setter, to trigger loading
 
   @property
   def sheet(self):
-    return self._sheet
+    return self._sheets[self._name]
 
   @sheet.setter
   def sheet(self, name):
@@ -54,22 +148,42 @@ class Book:
     if not isinstance(name, str):
       raise TypeError("select sheets by their name as a string")
     name = slugify(name)
-    try:
-      self._sheet = self._sheets[name]
-      logger.info(f"sheet {name} selected")
-    except KeyError:
-      raise ValueError(f"unknown sheet: {name}, options: {list(self._sheets.keys())}")
+    if name not in self._sheets:
+      raise ValueError(f"unknown sheet: {name}, options: {self._sheets.names}")
+    self._name = name
+    logger.info(f"sheet {name} selected")
 
   @property
   def config(self):
     """
-    the configuration consists of a mapping of the sheet names to their type.
+    the configuration consists of a mapping of the sheet names to their type,
+    and optionally of the sheets that are stored in a non-default format.
     """
-    return {
+    config = {
       "sheets" : {
-        name : sheet.__class__.__name__ for name, sheet in self._sheets.items()
+        name : self._sheets.classname(name) for name in self._sheets.names
       }
     }
+    if self._formats:
+      config["formats"] = dict(self._formats)
+    if self._storage != DEFAULT_STORAGE:
+      config["storage"] = self._storage
+    return config
+
+  @property
+  def storage(self):
+    return self._storage
+
+  @property
+  def database(self):
+    """
+    the connection to the database of the sqlite storage, opened on first use
+    """
+    if self._database is None:
+      from fintrack import sqlite
+      self._folder.mkdir(parents=True, exist_ok=True)
+      self._database = sqlite.connect(self._folder / sqlite.DATABASE)
+    return self._database
 
   # storage
 
@@ -95,58 +209,452 @@ class Book:
     }
     return subclasses
   
+  @profiling.timed("book.load")
   def load(self):
     """
-    loads all config/data from the folder
+    loads the config from the folder, sheets are loaded when first accessed
     """
     # load configuration
+    import yaml
     try:
       with (self._folder / "config.yaml").open() as fp:
         config = yaml.safe_load(fp)
     except FileNotFoundError:
       logger.warning(f"{self._folder} doesn't contain config.yaml")
-      config = { "sheets" : {} }
-    
-    # load sheets
-    self._sheets = {}
-    if "sheets" in config:
-      for name, classname in config["sheets"].items():
-        try:
-          sheetclass = self.types[classname]
-          with (self._folder / f"{name}.json").open() as fp:
-            self._sheets[name] = sheetclass()
-            recordtype = self._sheets[name].type
-            self._sheets[name].update(json.load(fp, cls=ClassDecoder(recordtype)))
-        except KeyError:
-          logger.warning(f"ignoring unknown sheetclass {classname}")
-        except FileNotFoundError:
-          logger.warning(f"could not find sheet {name}.json")
-
-    # ensure at least empty records and plans sheets are available
-    self._sheets = {
-      name : self.types[classname]() for name, classname in DEFAULT_SHEETS.items()
-    } | self._sheets
+      config = None
+
+    # register sheets, ensuring at least records and plans sheets are available
+    self._sheets = Sheets(self.load_sheet)
+    self._saved  = {}
+    self._disk   = {}
+    self._removals = {}
+    self._stored = config
+    config = config or { "sheets" : {} }
+    for name, classname in (DEFAULT_SHEETS | config.get("sheets", {})).items():
+      if classname in self.types:
+        self._sheets.register(name, classname)
+      else:
+        logger.warning(f"ignoring unknown sheetclass {classname}")
+
+    if self._database is not None:
+      self._database.close()
+      self._database = None
+    self._storage = config.get("storage", DEFAULT_STORAGE)
+    if self._storage not in STORAGES:
+      logger.warning(f"ignoring unknown storage {self._storage}")
+      self._storage = DEFAULT_STORAGE
+
+    self._formats = {}
+    for name, format in config.get("formats", {}).items():
+      if format in FORMATS:
+        self._formats[name] = format
+      else:
+        logger.warning(f"ignoring unknown format {format} for sheet {name}")
 
     self.sheet = DEFAULT_SHEET # after loading, make the "records" sheet active
     return self
+
+  @profiling.timed("book.load_sheet")
+  def load_sheet(self, name, classname):
+    """
+    loads a sheet's snapshot and replays its journal on top of it, or connects
+    it to its table in the database
+    """
+    if self._storage == "sqlite":
+      from fintrack import sqlite
+      sheet = sqlite.sheet(self.database, name, self.types[classname])
+    else:
+      sheet = self.types[classname]()
+      self._removals[name] = self.read_removals(name)[0] # reflected in what's read
+      snapshot, records, arrays = self.read_snapshot(name, sheet.type)
+      sheet.update(records)
+      sheet._arrays = arrays # still valid, until the journal is replayed
+      self._saved[name] = getattr(sheet, "version", None) # replays make it dirty
+      journal, offset = self.replay(name, sheet)
+      self._disk[name] = (snapshot, journal, offset)
+    if isinstance(sheet, PlannedSheet): # persist the occurrences of its plans
+      sheet.cache   = Occurrences(self._folder / f".{name}.cache.json", self.writing)
+      sheet.workers = self.workers
+    logger.debug(f"loaded sheet {name}")
+    return sheet
+
+  def read_snapshot(self, name, cls):
+    """
+    reads the records from the snapshot of the named sheet, along with the
+    identity of the file and, for columnar snapshots, its arrays. the records
+    of json snapshots are streamed, one at a time, as they are consumed.
+    """
+    path = self.path(name)
+    try:
+      if self.format(name) == "columnar":
+        with path.open("rb") as fp:
+          identity = self.identity(fp)
+          arrays   = columnar.read(fp)
+        return identity, columnar.records(arrays), arrays
+      fp = path.open()
+    except FileNotFoundError:
+      logger.debug(f"could not find sheet {path.name}")
+      return None, [], None
+    return self.identity(fp), self.stream(fp, cls), None
+
+  def stream(self, fp, cls):
+    """
+    generates the records from an open json snapshot, closing it when done
+    """
+    with fp, profiling.span("json.decode"):
+      yield from iterdecode(fp, cls)
+
+  def scan(self, name=None, start=None, until=None):
+    """
+    generates the records of the named, or current, sheet of records within
+    the start and until window, in timestamp order. if the sheet isn't loaded
+    yet, it isn't, and reading its, sorted, snapshot stops after until. plans
+    recur without end, so scanning them requires an until.
+    """
+    name = name or self._name
+    if until and not isinstance(until, datetime):
+      until = parse_datetime(until)
+    if start and not isinstance(start, datetime):
+      start = parse_datetime(start)
+    cls = self.types[self._sheets.classname(name)]
+    if until is None and issubclass(cls, PlannedSheet):
+      raise ValueError("scanning a sheet of plans requires an until")
+    if self._sheets.loaded(name) or self._storage != "files" or \
+       self.format(name) != "json" or \
+       not issubclass(cls, Sheet) or issubclass(cls, PlannedSheet):
+      return self._sheets[name].take(until=until, start=start)
+
+    identity, records, _ = self.read_snapshot(name, Record)
+    _, _, entries = self.read_journal(name, Record)
+    journaled = {} # the last journaled version of records, or None if removed
+    for entry in entries:
+      if isinstance(entry, Removal):
+        journaled[str(entry)] = None
+      else:
+        journaled[entry.uid] = entry
+
+    def within(record):
+      return (not start or record.timestamp >= start) and \
+             (not until or record.timestamp <= until)
+
+    def snapshot():
+      try:
+        for record in records:
+          if until and record.timestamp > until:
+            return
+          if within(record) and record.uid not in journaled:
+            yield record
+      finally:
+        if identity:
+          records.close() # stop reading the snapshot
+
+    logged = sorted(
+      record for record in journaled.values() if record and within(record)
+    )
+    return heapq.merge(snapshot(), logged, key=attrgetter("timestamp"))
+
+  def identity(self, file):
+    """
+    identifies the version of an open file, or a path, which changes when it is
+    replaced, or None if there is no such file
+    """
+    try:
+      stat = os.stat(file) if isinstance(file, Path) else os.fstat(file.fileno())
+    except FileNotFoundError:
+      return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
     
+  @profiling.timed("book.save")
   def save(self):
     """
-    save all config/data to the folder
+    save the config and the sheets that changed, folding in their journals
+    """
+    with self.locked():
+      if self._stored != self.config:
+        self.save_config()
+
+      # sheets that were never loaded, or are still as in their snapshot, are
+      # left untouched
+      for name in self.dirty:
+        self.compact(name)
+
+    return self
+
+  @contextmanager
+  def locked(self):
+    """
+    holds an exclusive, cooperative lock on the folder, for writing to it. the
+    lock is reentrant within a book.
     """
-    # ensure the folder exists
+    if self._locks or fcntl is None:
+      self._locks += 1
+      try:
+        yield self
+      finally:
+        self._locks -= 1
+      return
     self._folder.mkdir(parents=True, exist_ok=True)
+    with (self._folder / ".lock").open("a") as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      self._locks += 1
+      try:
+        yield self
+      finally:
+        self._locks -= 1
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+  def merge(self, name):
+    """
+    merges the records that other processes wrote to the named sheet since it
+    was last read, into the loaded sheet, skipping records with a known uid,
+    after dropping the records they removed. only rereads the snapshot if it
+    was replaced, and the journal and removals from where they were last read.
+    """
+    sheet = self._sheets[name]
+    # drop what others removed, even if their compaction folded it in already
+    offset, uids = self.read_removals(name, self._removals.get(name, 0))
+    self._removals[name] = offset
+    entries = [ Removal(uid) for uid in uids ]
+    snapshot, journal, offset = self._disk.get(name, (None, None, 0))
+    if self.identity(self.path(name)) != snapshot:
+      snapshot, records, _ = self.read_snapshot(name, sheet.type)
+      entries.extend(records)
+      journal, offset = None, 0
+    current = self.identity(self._folder / f"{name}.journal")
+    if current is None or current[0] != journal or current[2] != offset:
+      journal, offset, logged = self.read_journal(name, sheet.type, journal, offset)
+      entries.extend(logged)
+    if entries:
+      removed = self._removed.get(name, ())
+      def known(record): # or removed by us, and not to be resurrected
+        return record.uid in removed or sheet.get(record.uid) is not None
+      merged = self.apply(sheet, entries, skip=known)
+      if merged:
+        logger.info(f"merged {merged} changes from other writers into {name}")
+    self._disk[name] = (snapshot, journal, offset)
 
-    # save configuration
-    with (self._folder / "config.yaml").open("w") as fp:
-      yaml.safe_dump(self.config, fp, indent=2, default_flow_style=False)
+  @property
+  def dirty(self):
+    """
+    the names of the loaded sheets that changed since their snapshot was written
+    """
+    if self._storage != "files":
+      return [] # sheets write through to the database
+    return [
+      name for name, sheet in self._sheets.items()
+      if getattr(sheet, "version", None) != self._saved.get(name)
+    ]
+
+  def save_config(self):
+    """
+    save the configuration to the folder
+    """
+    import yaml
+    config = self.config
+    with self.writing(self._folder / "config.yaml") as fp:
+      yaml.safe_dump(config, fp, indent=2, default_flow_style=False)
+    self._stored = config
+    return self
+
+  @contextmanager
+  def writing(self, path, mode="w"):
+    """
+    provides a temporary file next to path, which replaces path once it has
+    been written completely, or is removed if writing it fails
+    """
+    self._folder.mkdir(parents=True, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+      if path.exists():
+        os.chmod(temp, path.stat().st_mode) # keep the permissions of the original
+      else:
+        os.chmod(temp, 0o666 & ~umask())    # like open() creates new files
+      with os.fdopen(fd, mode) as fp:
+        yield fp
+        fp.flush()
+        os.fsync(fp.fileno())
+      os.replace(temp, path)
+    except BaseException:
+      Path(temp).unlink(missing_ok=True)
+      raise
+
+  def format(self, name):
+    return self._formats.get(name, DEFAULT_FORMAT)
+
+  def path(self, name):
+    """
+    returns the path to the snapshot of the named sheet, in its format
+    """
+    return self._folder / f"{name}.{FORMATS[self.format(name)]}"
 
-    # save sheets
-    for name, sheet in self._sheets.items():
-      # save records
-      with (self._folder / f"{name}.json").open("w") as fp:
-        json.dump(sheet, fp, cls=ClassEncoder, indent=2)
+  def convert(self, name, format="columnar"):
+    """
+    converts the named sheet to another storage format
+    """
+    if format not in FORMATS:
+      raise ValueError(f"unknown format: {format}, options: {list(FORMATS)}")
+    if self._storage != "files":
+      raise ValueError(f"sheets can't be converted with {self._storage} storage")
+    self._sheets[name] # ensure it is loaded using its current format
+    previous = self.path(name)
+    current  = self._formats.pop(name, DEFAULT_FORMAT)
+    if format != DEFAULT_FORMAT:
+      self._formats[name] = format
+    try:
+      self.compact(name)
+    except (ValueError, TypeError):
+      self._formats.pop(name, None)
+      if current != DEFAULT_FORMAT:
+        self._formats[name] = current
+      raise
+    if previous != self.path(name):
+      previous.unlink(missing_ok=True)
+    self.save_config()
+    logger.info(f"converted sheet {name} to {format}")
+    return self
+
+  # journal
+
+  def replay(self, name, sheet):
+    """
+    adds the records from the journal of the named sheet to the given sheet and
+    returns the identity of the journal and up to where it was read
+    """
+    journal, offset, entries = self.read_journal(name, sheet.type)
+    self.apply(sheet, entries)
+    return journal, offset
 
+  def apply(self, sheet, entries, skip=None):
+    """
+    applies journal entries to a sheet, in order: records are added, in runs,
+    and removals remove the record with their uid, if it is still there.
+    records for which the optional skip function is true aren't added.
+    returns the number of applied entries.
+    """
+    applied = 0
+    records = []
+    for entry in entries:
+      if isinstance(entry, Removal):
+        sheet.update(records)
+        applied += len(records)
+        records = []
+        if sheet.get(entry) is not None:
+          sheet.remove(entry)
+          applied += 1
+      elif not skip or not skip(entry):
+        records.append(entry)
+    sheet.update(records)
+    return applied + len(records)
+
+  def read_journal(self, name, cls, journal=None, offset=0):
+    """
+    reads the entries from the journal of the named sheet, from offset if it
+    is still the same journal, and returns its identity, the offset up to
+    where it was read completely and the entries: records and removals
+    """
+    records = []
+    try:
+      with (self._folder / f"{name}.journal").open("rb") as fp:
+        identity = self.identity(fp)[0]
+        if identity != journal:
+          offset = 0
+        fp.seek(offset)
+        decoder = ClassDecoder(cls)()
+        for line in fp:
+          if not line.endswith(b"\n"):
+            break # still being written, or torn, read it again next time
+          offset += len(line)
+          line = line.strip()
+          if not line:
+            continue
+          try:
+            if line.startswith(TOMBSTONE):
+              records.append(Removal(json.loads(line)["removed"]))
+            else:
+              records.append(decoder.decode(line.decode()))
+          except (json.JSONDecodeError, UnicodeDecodeError, KeyError):
+            # a partially written entry, e.g. due to a crash while appending
+            logger.warning(f"ignoring corrupt journal entry in {name}.journal")
+      return identity, offset, records
+    except FileNotFoundError:
+      return None, 0, records
+
+  def read_removals(self, name, offset=0):
+    """
+    reads the uids of removed records of the named sheet from offset, and
+    returns the offset up to where they were read completely and the uids
+    """
+    uids = []
+    try:
+      with (self._folder / f".{name}.removed").open("rb") as fp:
+        fp.seek(offset)
+        for line in fp:
+          if not line.endswith(b"\n"):
+            break # still being written
+          offset += len(line)
+          uids.append(line.decode().strip())
+    except FileNotFoundError:
+      pass
+    return offset, uids
+
+  def log_removals(self, name, uids):
+    """
+    appends the uids of removed records to the removals of the named sheet.
+    unlike journals, these are never folded into the snapshot, so that books
+    that loaded the sheet before, can still drop them when merging.
+    """
+    with self.locked():
+      self.merge(name)
+      with (self._folder / f".{name}.removed").open("ab") as fp:
+        for uid in uids:
+          fp.write(f"{uid}\n".encode())
+        self._removals[name] = fp.tell()
+
+  def log(self, name, records, removed=()):
+    """
+    appends the removal of records, by uid, and records to the journal of the
+    named sheet and compacts it when it has grown beyond the journal limit
+    """
+    with self.locked():
+      if self._stored != self.config:
+        self.save_config()
+
+      if removed:
+        self.log_removals(name, removed)
+      self.merge(name) # entries of others, before ours, keep the offset valid
+      snapshot, _, offset = self._disk[name]
+      with (self._folder / f"{name}.journal").open("ab") as fp:
+        if fp.tell() > offset: # a torn entry, e.g. due to a crash, end it
+          fp.write(b"\n")
+        for uid in removed:
+          fp.write((json.dumps({ "removed" : uid }) + "\n").encode())
+        for record in records:
+          fp.write((json.dumps(record, cls=ClassEncoder) + "\n").encode())
+        fp.flush()
+        size = fp.tell()
+        self._disk[name] = (snapshot, self.identity(fp)[0], size)
+
+      if size > self.journal_limit:
+        logger.info(f"compacting journal of sheet {name}")
+        self.compact(name)
+
+  @profiling.timed("book.compact")
+  def compact(self, name):
+    """
+    writes a snapshot of the named sheet and removes its, now folded in, journal
+    """
+    with self.locked():
+      self.merge(name)
+      sheet = self._sheets[name]
+      if self.format(name) == "columnar":
+        with self.writing(self.path(name), "wb") as fp:
+          columnar.save(sheet, fp)
+      else:
+        with self.writing(self.path(name)) as fp:
+          json.dump(sheet, fp, cls=ClassEncoder, indent=2)
+      (self._folder / f"{name}.journal").unlink(missing_ok=True)
+      self._disk[name] = (self.identity(self.path(name)), None, 0)
+      self._saved[name] = getattr(sheet, "version", None)
     return self
 
   # sheet management
@@ -163,25 +671,146 @@ class Book:
 
   # record management
 
-  def add(self, *args, **kwargs):
+  def add(self, *args, existing="add", **kwargs):
+    """
+    add a record or plan using their arguments to the current sheet and persist
+    it, either by appending it to the sheet's journal, or by saving the book.
+    if its uid is already known, it can also be skipped or update the known
+    one, see store. returns the record, or the known one if it was skipped.
+    """
+    record = self.sheet.record(*args, **kwargs)
+    added, updated, _ = self.store([ record ], existing=existing)
+    if added or updated:
+      logger.info(f"{'added' if added else 'updated'} {record}")
+      return record
+    logger.info(f"skipped {record}, its uid is already known")
+    return self.sheet.get(record.uid)
+
+  def store(self, records, existing="add"):
+    """
+    adds records to the current sheet and persists them. with existing set to
+    skip or update, records with a uid that is already known are skipped, or
+    replace the known record, unless it is the same. returns the added and
+    updated records, and the number of skipped ones.
+    """
+    if existing not in EXISTING:
+      raise ValueError(f"unknown existing mode: {existing}, options: {list(EXISTING)}")
+    sheet   = self.sheet
+    added   = records
+    updated = []
+    skipped = 0
+    if existing != "add":
+      added = []
+      seen  = set()
+      for record in records:
+        known = sheet.get(record.uid)
+        if record.uid in seen or known == record or (known and existing == "skip"):
+          skipped += 1
+        elif known:
+          updated.append(record)
+        else:
+          added.append(record)
+        seen.add(record.uid)
+      for record in updated:
+        sheet.replace(record.uid, record)
+    if len(added) == 1:
+      sheet.add(added[0]) # keeps extending the balance index
+    else:
+      sheet.update(added)
+    if added or updated:
+      self.persist(added + updated, removed=[ record.uid for record in updated ])
+    return added, updated, skipped
+
+  def remove(self, uid):
     """
-    add a record or plan using their arguments to the current sheet and save
+    removes the record with the given uid from the current sheet and persists
+    its removal, raising a KeyError if there is no such record
     """
-    record = self.sheet.add(*args, **kwargs)
-    self.save()
-    logger.info(f"added {record}")
+    record = self.sheet.remove(uid)
+    self._removed.setdefault(self._name, set()).add(record.uid)
+    self.persist([], removed=[ record.uid ])
+    logger.info(f"removed {record}")
     return record
 
-  def slurp(self, source=sys.stdin):
+  def replace(self, uid, *args, **kwargs):
+    """
+    replaces the record with the given uid on the current sheet by a new one,
+    with the same uid, and persists it
+    """
+    record = self.sheet.replace(uid, *args, **kwargs)
+    self.persist([ record ], removed=[ record.uid ])
+    logger.info(f"replaced {uid} by {record}")
+    return record
+
+  def persist(self, records, removed=()):
+    """
+    persists records that were added to, and uids of records that were removed
+    from, the current sheet
+    """
+    if self._storage == "sqlite": # the sheet already wrote them to its table
+      if self._stored != self.config:
+        self.save_config()
+    elif self.journal:
+      self.log(self._name, records, removed)
+    else:
+      if removed:
+        self.log_removals(self._name, removed)
+      self.save()
+
+  def slurp(self, source=sys.stdin, batch=SLURP_BATCH, existing="add"):
     """
     reads tab separated rows from source iterable, default is stdin, and
-    imports them as records
+    imports them as records. lines are parsed in batches, bad rows are skipped
+    and reported, and all records are merged into the sheet and persisted at
+    once. returns statistics about the import.
+    to import overlapping files, e.g. bank exports, safely, existing can be set
+    to skip or update, see store. rows without a uid then get one derived from
+    their timestamp, amount, description and how many identical rows preceded
+    them, so the same rows get the same uids when they are imported again.
     """
-    for line in source:
-      line = line.strip()
-      if not line:
-        break
-      self.add(*line.split("\t"))
+    if existing not in EXISTING:
+      raise ValueError(f"unknown existing mode: {existing}, options: {list(EXISTING)}")
+    started = time.perf_counter()
+    records = []
+    bad     = []
+    derived = Counter() # occurrences of identical rows
+    lines   = enumerate(source, 1)
+    while chunk := list(islice(lines, batch)):
+      for number, line in chunk:
+        line = line.strip()
+        if not line:
+          continue
+        try:
+          values = line.split("\t")
+          record = self.sheet.type(*values)
+          if record.timestamp is None:
+            raise ValueError("invalid timestamp")
+          if existing != "add" and len(values) < len(record.columns):
+            key = (record.timestamp.isoformat(), str(record.amount), record.description)
+            record.uid = derived_uid(*key, derived[key])
+            derived[key] += 1
+          records.append(record)
+        except (ValueError, TypeError, InvalidOperation) as e:
+          logger.warning(f"skipping bad row {number}: {line} ({e})")
+          bad.append(number)
+
+    added, updated, skipped = self.store(records, existing=existing)
+
+    duration = time.perf_counter() - started
+    stats = {
+      "imported" : len(added),
+      "updated"  : len(updated),
+      "skipped"  : skipped,
+      "bad"      : len(bad),
+      "seconds"  : round(duration, 3),
+      "rate"     : round(len(records) / duration) if duration else len(records)
+    }
+    logger.info(
+      f"slurped {stats['imported']} records in {stats['seconds']}s "
+      f"({stats['rate']} rows/s), updated {stats['updated']}, "
+      f"skipped {stats['skipped']} known and {stats['bad']} bad rows"
+    )
+    return stats
 
   # iterator support, making Book a list of what's on its current sheet
 
@@ -194,8 +823,62 @@ class Book:
   def __getitem__(self, index):
     return self.sheet[index]
 
+class Sheets(dict):
+  """
+  a dict of sheets by name, that only loads registered sheets when they are
+  first accessed. iterating it only covers the sheets that have been loaded.
+  """
+  def __init__(self, loader):
+    super().__init__()
+    self._loader  = loader
+    self._classes = {}     # classnames of all known sheets: name -> classname
+
+  def register(self, name, classname):
+    """
+    registers a sheet by name and classname, to be loaded when accessed
+    """
+    self._classes[name] = classname
+    super().pop(name, None)
+
+  def __missing__(self, name):
+    if name not in self._classes:
+      raise KeyError(name)
+    sheet = self._loader(name, self._classes[name])
+    super().__setitem__(name, sheet)
+    return sheet
+
+  def __setitem__(self, name, sheet):
+    self._classes[name] = sheet.__class__.__name__
+    super().__setitem__(name, sheet)
+
+  def __contains__(self, name):
+    return name in self._classes
+
+  def loaded(self, name):
+    """
+    returns whether the named sheet has been loaded already
+    """
+    return super().__contains__(name)
+
+  @property
+  def names(self):
+    return list(self._classes.keys())
+
+  def classname(self, name):
+    return self._classes[name]
+
 # Sheets
 
+class Moment:
+  """
+  a point in time, comparable to records, e.g. to bisect sorted records
+  """
+  def __init__(self, timestamp):
+    self.timestamp = timestamp
+
+  def __lt__(self, other):
+    return self.timestamp < other.timestamp
+
 class SheetLike:
   """
   a sheet maintains a sorted collection of <records> of a implemented type prop
@@ -217,6 +900,20 @@ class SheetLike:
   def add(self, *args, **kwargs):
     raise NotImplementedError(f"{self.__class__.__name__} add() needs to be implemented")
 
+  def remove(self, uid):
+    raise NotImplementedError(f"{self.__class__.__name__} remove() needs to be implemented")
+
+  def record(self, *args, **kwargs):
+    """
+    returns a record of the correct type for this sheet, given a record, a dict
+    with the arguments to construct one, or the actual arguments to construct one
+    """
+    if len(args) == 1 and isinstance(args[0], self.type):
+      return args[0]
+    if len(args) == 1 and isinstance(args[0], dict):
+      return self.type(**args[0])
+    return self.type(*args, **kwargs)
+
   # list-like behavior based on add()
 
   def update(self, other):
@@ -234,6 +931,27 @@ class SheetLike:
     new.update(other)
     return new
 
+  # access by uid
+
+  def get(self, uid, default=None):
+    """
+    returns the record with the given uid, or default if there is none
+    """
+    for record in self:
+      if record.uid == uid:
+        return record
+    return default
+
+  def replace(self, uid, *args, **kwargs):
+    """
+    replaces the record with the given uid by a new one, that keeps the uid
+    """
+    record = self.record(*args, **kwargs)
+    record.uid = uid
+    self.remove(uid)
+    self.add(record)
+    return record
+
   # list-like behavior based on iterator support
 
   def __getitem__(self, index):
@@ -271,8 +989,36 @@ class SheetLike:
     """
     alternative iterator, providing records as lists of their properties 
     """
-    for record in self:
-      yield asrow(record)
+    return asrows(self)
+
+  def slice(self, first=0, last=None):
+    """
+    provides the records from first to last (exclusive) position
+    """
+    return islice(self, first, last)
+
+  def slice_rows(self, first=0, last=None):
+    """
+    provides the rows of the records from first to last (exclusive) position
+    """
+    return asrows(self.slice(first, last))
+
+  # reporting
+
+  @property
+  def arrays(self):
+    """
+    the records as columnar NumPy arrays
+    """
+    if not issubclass(self.type, Record):
+      raise TypeError(f"only sheets of Records have arrays, not {self.type.__name__}")
+    return columnar.columns(self)
+
+  def report(self, by="month", pattern=None):
+    """
+    aggregates amounts by period and/or matching part of the description
+    """
+    return Report(self.arrays, by=by, pattern=pattern)
 
 class ImmutableSheetLike(SheetLike):
   def add(self, *args, **kwargs):
@@ -284,16 +1030,23 @@ class ImmutableSheetLike(SheetLike):
   def __add__(self, other):
     raise TypeError(f"{self.__class__.__name__} is immutable")
 
+  def remove(self, uid):
+    raise TypeError(f"{self.__class__.__name__} is immutable")
+
 class Sheet(SheetLike):
   """
-  a standard sheet, provides access to a list of records/rows
+  a standard sheet, provides access to a list of records/rows, and to records
+  by their uid, using an index that is kept in sync with them
   """
 
   def __init__(self, records=None):
     self._records = SortedList()
+    self._uids    = {}    # index of records by their (compact) uid
+    self._arrays  = None  # cached columnar arrays
+    self.version  = 0     # incremented on every change, to detect changes
+    self.balanced = BalancedSheet(self)
     if records:
       self.update(records)
-    self.balanced = BalancedSheet(self)
 
   @property
   def type(self):
@@ -308,13 +1061,49 @@ class Sheet(SheetLike):
          sheet.add({ "amount" : -125, "description": "test" })
          sheet.add(-125, "test")
     """
-    if len(args) == 1 and isinstance(args[0], self.type):
-      record = args[0]
-    elif len(args) == 1 and isinstance(args[0], dict):
-      record = self.type(**args[0])
-    else:
-      record = self.type(*args, **kwargs)
-    self._records.add(record)
+    record = self.record(*args, **kwargs)
+    with profiling.span("sheet.insert"):
+      self._records.add(record)
+      self._uids[record._uid] = record
+    profiling.count("sheet.inserted")
+    self._arrays  = None
+    self.version += 1
+    self.balanced.changed(self._records.bisect_right(record) - 1)
+    return record
+
+  def update(self, other):
+    """
+    merges in records from other sheet, or any iterable of records, in one
+    sorted merge
+    """
+    records = [ self.record(record) for record in other ]
+    if records:
+      position = self._records.bisect_left(min(records))
+      with profiling.span("sheet.insert"):
+        self._records.update(records)
+        self._uids.update((record._uid, record) for record in records)
+      profiling.count("sheet.inserted", len(records))
+      self._arrays  = None
+      self.version += 1
+      self.balanced.changed(position) # once inserted, the index can be extended
+
+  def get(self, uid, default=None):
+    # optimization over the generic version on SheetLike
+    return self._uids.get(CompactUid.compact(uid), default)
+
+  def remove(self, uid):
+    """
+    removes the record with the given uid and returns it, or raises a KeyError
+    if there is no such record
+    """
+    record   = self._uids.pop(CompactUid.compact(uid))
+    position = self._records.bisect_left(record)
+    while self._records[position] is not record: # skip others at the same time
+      position += 1
+    del self._records[position]
+    self._arrays  = None
+    self.version += 1
+    self.balanced.changed(position)
     return record
 
   def __iter__(self):
@@ -327,26 +1116,76 @@ class Sheet(SheetLike):
     # optimization over the generic version on SheetLike
     return self._records[index]
 
+  @property
+  def arrays(self):
+    """
+    optimization over the generic version on SheetLike, extracting the arrays
+    only once, until the sheet changes
+    """
+    if self._arrays is None:
+      self._arrays = super().arrays
+    return self._arrays
+
+  def slice(self, first=0, last=None):
+    # optimization over the generic version on SheetLike
+    return self._records.islice(first, last)
+
+  def take(self, count=None, until=None, start=None):
+    """
+    optimization over the generic version on SheetLike, bisecting the sorted
+    records to only visit those within the start/until window
+    """
+    first, last = self.span(until=until, start=start)
+    if count:
+      last = min(last, first + count)
+    return self._records.islice(first, last)
+
+  def span(self, until=None, start=None):
+    """
+    returns the first and last (exclusive) position of records within the
+    start/until window
+    """
+    if until and not isinstance(until, datetime):
+      until = parse_datetime(until)
+    if start and not isinstance(start, datetime):
+      start = parse_datetime(start)
+    first = self._records.bisect_left(Moment(start)) if start else 0
+    last  = self._records.bisect_right(Moment(until)) if until else len(self)
+    return first, max(first, last)
+
 class PlannedSheet(Sheet):
   """
   a PlanedSheet holds PlannedRecords and behaves as a Sheet, except for the take
-  method that unrolls the PlannedRecords into Records
+  method that unrolls the PlannedRecords into Records, caching their occurrences.
+  with workers, many plans are expanded in parallel, by that many processes.
   """
 
+  def __init__(self, records=None, workers=PLAN_WORKERS):
+    self.cache    = Occurrences() # only in memory, unless a book persists it
+    self.workers  = workers
+    self.parallel = PARALLEL_PLANS # plans needed to expand them in parallel
+    super().__init__(records)
+
   @property
   def type(self):
     return PlannedRecord
 
   def take(self, count=None, until=None, start=None):
     """
-    generator that yields records matching criteria, after generating plans
+    generator that yields records matching criteria, lazily merging the
+    occurrences of all plans in timestamp order
     """
-    # first create a virtual sheet from all plans, ensuring cross-sheet ordering
-    records = Sheet()
-    for plan in self:
-      records.update(plan.take(count=count, until=until, start=start))
-    # and now take from that
-    return records.take(count=count, until=until, start=start)
+    if until and not isinstance(until, datetime):
+      until = parse_datetime(until)
+    if start and not isinstance(start, datetime):
+      start = parse_datetime(start)
+    if until and self.workers and len(self) >= self.parallel:
+      self.cache.expand(self, until, start=start, workers=self.workers)
+    merged = heapq.merge(
+      *[ self.cache.occurrences(plan, until=until, start=start) for plan in self ],
+      key=attrgetter("timestamp")
+    )
+    return self.cache.saving(islice(merged, count) if count else merged)
 
 @dataclass
 class SheetExtract(ImmutableSheetLike):
@@ -373,22 +1212,23 @@ class SheetExtract(ImmutableSheetLike):
     return self.take(count=self.count, until=self.until, start=self.start)
 
   def __len__(self):
-    # ugly ;-)
-    records = list(self.take(count=self.count, until=self.until, start=self.start))
-    return len(records)
+    return sum(1 for _ in self)
 
   def take(self, count=None, until=None, start=None):
     return self.sheet.take(count=count, until=until, start=start)
 
 class CombinedSheet(ImmutableSheetLike):
   """
-  a SheetLike, combining extractions from other sheets.
+  a SheetLike, combining extractions from other sheets, as a lazy ordered merge
+  of them.
   """
-  def __init__(self, extracts):
+  def __init__(self, extracts, cached=False):
     """
-    a combined sheet 
+    a combined sheet, optionally caching its records once they're materialized
     """
     self._extracts = extracts
+    self._cached   = cached
+    self._records  = None
 
   @property
   def type(self):
@@ -396,23 +1236,75 @@ class CombinedSheet(ImmutableSheetLike):
 
   def __iter__(self):
     """
-    creates a combination of all extracts and provides them as an iterable
+    merges all, already sorted, extracts and provides them as an iterable
     """
-    combined = Sheet()
-    for sheet in self._extracts:
-      combined.update(sheet)
-    return iter(combined)
+    if self._records is not None:
+      return iter(self._records)
+    merged = heapq.merge(*self._extracts, key=attrgetter("timestamp"))
+    if self._cached:
+      self._records = list(merged)
+      return iter(self._records)
+    return merged
 
   def __len__(self):
+    if self._records is not None:
+      return len(self._records)
     return sum( [ len(sheet) for sheet in self._extracts ] )
 
+  def refresh(self):
+    """
+    drops the cached records, e.g. when the underlying sheets have changed
+    """
+    self._records = None
+    return self
+
+class DynamicSheet(ImmutableSheetLike):
+  """
+  a SheetLike composing other sheets by reference, each taken with its own
+  window. nothing is evaluated until it is iterated, so it always reflects the
+  current state of the sheets, and relative windows, e.g. "next month", stay
+  relative.
+  """
+  def __init__(self):
+    self._parts   = [] # (sheet, window) tuples, with take arguments as window
+    self.balanced = BalancedSheet(self)
+
+  def include(self, sheet, count=None, until=None, start=None):
+    """
+    includes a sheet, optionally restricted to a window
+    """
+    self._parts.append( (sheet, { "count": count, "until": until, "start": start }) )
+    return self
+
+  @property
+  def type(self):
+    return Record
+
+  def __iter__(self):
+    """
+    lazily merges what is taken from all included sheets, in timestamp order
+    """
+    return heapq.merge(
+      *[ sheet.take(**window) for sheet, window in self._parts ],
+      key=attrgetter("timestamp")
+    )
+
+  def __len__(self):
+    return sum(1 for _ in self)
+
 class BalancedSheet(SheetLike):
   """
-  wraps a sheet overriding rows and columns properties to include a balance
+  wraps a sheet overriding rows and columns properties to include a balance,
+  starting from an opening balance, e.g. of the records before a window. for
+  sheets of records, an index of the balance after each record is kept,
+  aligned with the sorted records, to look up balances without summing them.
   """
   def __init__(self, sheet):
     self._sheet = sheet
     self._amount_index = sheet.columns.index("amount")
+    self._indexed  = isinstance(sheet, Sheet) and issubclass(sheet.type, Record)
+    self._balances = [] # balance after each record, valid for the first ones
+    self.opening   = Decimal(0)
   
   def __getattr__(self, attr):
     """
@@ -420,6 +1312,71 @@ class BalancedSheet(SheetLike):
     """
     return getattr(self._sheet, attr)
 
+  def __iter__(self):
+    return iter(self._sheet)
+
+  def __len__(self):
+    return len(self._sheet)
+
+  def take(self, count=None, until=None, start=None):
+    return self._sheet.take(count=count, until=until, start=start)
+
+  # balance index
+
+  def changed(self, position):
+    """
+    updates the index after the records from position onwards have changed,
+    appending to it, if possible, or else dropping the affected balances
+    """
+    del self._balances[position:]
+    if self._indexed and position == len(self._sheet) - 1:
+      self._balances.append(
+        DECIMAL_CONTEXT.add(self.balance(position), self._sheet[position].amount)
+      )
+
+  def balance(self, position):
+    """
+    returns the balance of the records before position
+    """
+    if not self._indexed:
+      try: # e.g. summed in the database
+        return DECIMAL_CONTEXT.add(self.opening, self._sheet.total(0, position))
+      except AttributeError:
+        pass
+      balance = self.opening
+      for record in islice(self._sheet, position):
+        balance = DECIMAL_CONTEXT.add(balance, record.amount)
+      return balance
+    if len(self._balances) < position:
+      balance = self._balances[-1] if self._balances else self.opening
+      for record in self._sheet._records.islice(len(self._balances), position):
+        balance = DECIMAL_CONTEXT.add(balance, record.amount)
+        self._balances.append(balance)
+    return self._balances[position-1] if position else self.opening
+
+  def balance_at(self, timestamp):
+    """
+    returns the balance after all records up to and including timestamp
+    """
+    if not self._indexed:
+      return DECIMAL_CONTEXT.add(self.opening, self.balance_between(until=timestamp))
+    _, last = self._sheet.span(until=timestamp)
+    return self.balance(last)
+
+  def balance_between(self, start=None, until=None):
+    """
+    returns the change in balance due to the records within start and until
+    """
+    if not self._indexed:
+      balance = Decimal(0)
+      for record in self._sheet.take(start=start, until=until):
+        balance = DECIMAL_CONTEXT.add(balance, record.amount)
+      return balance
+    first, last = self._sheet.span(until=until, start=start)
+    return DECIMAL_CONTEXT.subtract(self.balance(last), self.balance(first))
+
+  # rows and columns
+
   @property
   def columns(self):
     """
@@ -434,8 +1391,48 @@ class BalancedSheet(SheetLike):
     """
     returns rows with additional balance column after the amount column
     """
-    balance = 0
-    for row in self._sheet.rows:
-      balance += row[self._amount_index]
-      row.insert(self._amount_index+1, balance)
+    return self.slice_rows()
+
+  def slice_rows(self, first=0, last=None):
+    """
+    returns rows of the records from first to last (exclusive) position, with
+    their balance, starting from the balance before the first one
+    """
+    balance = self.balance(first)
+    for row in rawrows(self._sheet.slice(first, last)):
+      balance = DECIMAL_CONTEXT.add(balance, row[self._amount_index])
+      row = [ humanized(value) for value in row ]
+      row.insert(self._amount_index+1, humanized(balance))
       yield row
+
+  def window(self, count=None, until=None, start=None):
+    """
+    returns rows of the records within the start/until window, with their
+    balance, starting from the balance before the window
+    """
+    if self._indexed:
+      first, last = self._sheet.span(until=until, start=start)
+      if count:
+        last = min(last, first + count)
+      return self.slice_rows(first, last)
+    return self._scanned_window(count=count, until=until, start=start)
+
+  def _scanned_window(self, count=None, until=None, start=None):
+    if until and not isinstance(until, datetime):
+      until = parse_datetime(until)
+    if start and not isinstance(start, datetime):
+      start = parse_datetime(start)
+    balance = self.opening
+    yielded = 0
+    for record in self._sheet:
+      balance = DECIMAL_CONTEXT.add(balance, record.amount)
+      if start and record.timestamp < start:
+        continue
+      if until and record.timestamp > until:
+        return
+      row = asrow(record)
+      row.insert(self._amount_index+1, humanized(balance))
+      yield row
+      yielded += 1
+      if count and yielded >= count:
+        return
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fintrack.records import Record
+from fintrack.utils   import DECIMAL_CONTEXT
+
+import logging
+logger = logging.getLogger(__name__)
+
+# maximum number of decimals that are kept for amounts
+MAX_SCALE = 6
+
+INT64_MAX = 2**63 - 1
+
+EPOCH       = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+def numpy():
+  """
+  imports numpy, an optional dependency, only required for columnar sheets
+  """
+  try:
+    import numpy
+  except ModuleNotFoundError:
+    raise ModuleNotFoundError("columnar sheets require numpy: pip install fintrack[columnar]")
+  return numpy
+
+def scale_of(amounts):
+  """
+  returns the number of decimals needed to represent all amounts, which can't
+  be more than MAX_SCALE, as they would be rounded
+  """
+  scale = 0
+  for amount in amounts:
+    exponent = amount.as_tuple().exponent
+    if isinstance(exponent, int) and -exponent > scale:
+      if -exponent > MAX_SCALE: # unless they are superfluous zeros
+        exponent = DECIMAL_CONTEXT.normalize(amount).as_tuple().exponent
+        if -exponent > MAX_SCALE:
+          raise ValueError(
+            f"amounts with more than {MAX_SCALE} decimals can't be stored in a columnar sheet"
+          )
+      scale = max(scale, -exponent)
+  return scale
+
+def amount(value, scale):
+  """
+  turns a scaled integer back into a Decimal, without superfluous zeros
+  """
+  while scale and value % 10 == 0:
+    value //= 10
+    scale  -= 1
+  return Decimal(f"{value}E-{scale}")
+
+def table(strings):
+  """
+  returns a table of the unique strings, in order of appearance, and the index
+  of each string in it
+  """
+  np = numpy()
+  indexes = {}
+  index   = [ indexes.setdefault(string, len(indexes)) for string in strings ]
+  return np.array(list(indexes), dtype=str), np.array(index, dtype=np.int64)
+
+def columns(records):
+  """
+  turns an iterable of Records in a dict of NumPy arrays: timestamps as int64
+  microseconds since the epoch, amounts as int64 integers scaled by a power of
+  ten and descriptions and uids as indexes into tables of unique strings
+  """
+  np = numpy()
+  records = list(records)
+
+  amounts = [ record.amount for record in records ]
+  scale   = scale_of(amounts)
+  scaled  = [
+    int(DECIMAL_CONTEXT.to_integral_value(DECIMAL_CONTEXT.scaleb(amount, scale)))
+    for amount in amounts
+  ]
+  if scaled and max(abs(value) for value in scaled) > INT64_MAX:
+    raise ValueError("amounts are too large to be stored in a columnar sheet")
+
+  timestamps = [ record.timestamp for record in records ]
+  if any(timestamp.tzinfo for timestamp in timestamps):
+    raise ValueError("columnar sheets only support naive timestamps")
+
+  descriptions, description_index = table(record.description for record in records)
+  uids, uid_index = table(record.uid for record in records)
+
+  return {
+    "timestamp"    : np.array(
+      [ (timestamp - EPOCH) // MICROSECOND for timestamp in timestamps ],
+      dtype=np.int64
+    ),
+    "amount"       : np.array(scaled, dtype=np.int64),
+    "scale"        : np.array(scale, dtype=np.int64),
+    "descriptions" : descriptions,
+    "description"  : description_index,
+    "uids"         : uids,
+    "uid"          : uid_index
+  }
+
+def records(columns):
+  """
+  turns a dict of NumPy arrays back into a list of Records
+  """
+  scale        = int(columns["scale"])
+  timestamps   = columns["timestamp"].astype("datetime64[us]").tolist()
+  descriptions = columns["descriptions"].tolist()
+  uids         = columns["uids"].tolist()
+  return [
+    Record(
+      amount(value, scale),
+      descriptions[description],
+      timestamp,
+      uids[uid]
+    )
+    for timestamp, value, description, uid in zip(
+      timestamps,
+      columns["amount"].tolist(),
+      columns["description"].tolist(),
+      columns["uid"].tolist()
+    )
+  ]
+
+def save(sheet, fp):
+  """
+  writes the records of a sheet to a file(-like object) in columnar format
+  """
+  if not issubclass(sheet.type, Record):
+    raise TypeError(f"columnar sheets only support Records, not {sheet.type.__name__}")
+  numpy().savez(fp, **columns(sheet))
+
+def read(fp):
+  """
+  reads the arrays from a file(-like object) in columnar format, in one read
+  """
+  with numpy().load(fp, allow_pickle=False) as data:
+    return { key : data[key] for key in data.files }
+
+def load(fp):
+  """
+  reads records from a file(-like object) in columnar format
+  """
+  return records(read(fp))
@@ -1,21 +1,45 @@
-from dataclasses import dataclass, field
+import sys
+import json
+import hashlib
 
-from recurrent.event_parser import RecurringEvent
-from datetime import datetime
-from dateutil.rrule import rrulestr
+from dataclasses import dataclass
+
+from functools import lru_cache
+from itertools import islice
 
-from humanize import naturalday
+from datetime import datetime
 
 from decimal import Decimal, getcontext
 
-from fintrack.records import RecordLike, Record
-from fintrack.utils   import now, uid, parse_amount, parse_datetime
+from fintrack.records  import RecordLike, Record, CompactUid
+from fintrack.columnar import EPOCH, MICROSECOND
+from fintrack.utils    import now, today, uid, parse_amount, parse_datetime, slotted
+from fintrack.utils    import naturalday
+
+from fintrack import profiling
 
 import logging
 logger = logging.getLogger(__name__)
 
 getcontext().prec = 2
 
+def RecurringEvent():
+  """
+  creates a schedule parser, importing recurrent only when plans are compiled
+  """
+  from recurrent.event_parser import RecurringEvent
+  return RecurringEvent()
+
+@lru_cache(maxsize=1024)
+def compile_rule(event, dtstart):
+  """
+  turns a parsed recurring event into a rule, starting at dtstart. rules are
+  shared between all plans with the same event and start.
+  """
+  from dateutil.rrule import rrulestr
+  return rrulestr(event, dtstart=dtstart)
+
+@slotted("_uid", "_compiled", "_next")
 @dataclass
 class PlannedRecord(RecordLike):
   """
@@ -24,7 +48,7 @@ class PlannedRecord(RecordLike):
   schedule    : str
   # optional
   uids        : str = None
-  uid         : str = field(default_factory=uid)
+  uid         : str = CompactUid()
   
   columns = ( "schedule", "amount", "description", "uids", "uid" )
     
@@ -32,25 +56,67 @@ class PlannedRecord(RecordLike):
     """
     if amount is a string, parse it, ensure the schedule is valid
     """
-    # ensure the schedule is valid
-    if RecurringEvent().parse(self.schedule) is None:
-      raise ValueError("schedule is invalid")
+    # ensure the schedule is valid, by compiling it
+    self.compile()
     if not isinstance(self.amount, Decimal):
       self.amount = parse_amount(self.amount)
+    if isinstance(self.description, str):
+      self.description = sys.intern(self.description)
+    if self.uid is None:
+      self.uid = uid()
+
+  def compile(self):
+    """
+    parses the schedule once, into a recurring event or a single datetime
+    """
+    r = RecurringEvent()
+    event = r.parse(self.schedule)
+    if event is None:
+      raise ValueError("schedule is invalid")
+    self._compiled = (self.schedule, event, r.is_recurring)
+    self._next     = None # cached next occurrence: (day, Record or None)
+
+  @property
+  def event(self):
+    """
+    the compiled schedule, recompiled if the schedule was changed
+    """
+    self.recompile_if_changed()
+    return self._compiled[1:]
+
+  def recompile_if_changed(self):
+    """
+    compiles the schedule again, if it was changed since it was compiled
+    """
+    if self._compiled[0] != self.schedule:
+      self.compile()
 
   def __repr__(self):
     return f"plan for {self.amount} {self.schedule} {self.description}"
 
   @property
   def next_occurrence(self):
-    return self.take(1)[0]
+    """
+    the next occurrence from now, cached until it has passed, or for the day
+    """
+    self.recompile_if_changed() # which also resets the cache
+    day = today()
+    if self._next is None or self._next[0] != day or \
+       (self._next[1] and self._next[1].timestamp < now()):
+      occurrences = self.take(1)
+      self._next  = (day, occurrences[0] if occurrences else None)
+    return self._next[1]
   
   @property
-  def timestmap(self):
-    return self.next_occurence.timestamp
+  def timestamp(self):
+    """
+    the timestamp of the next occurrence, or datetime.max if there is none
+    """
+    occurrence = self.next_occurrence
+    return occurrence.timestamp if occurrence else datetime.max
   
   def __lt__(self, other):
-    return self.next_occurrence.timestamp < other.next_occurrence.timestamp
+    return self.timestamp < other.timestamp
     
   def occurrence(self, on_date, index):
     args = [ self.amount, self.description, on_date ]
@@ -58,33 +124,264 @@ class PlannedRecord(RecordLike):
       args.append(self.uids.format(plan=self, index=index, date=naturalday(on_date)))
     return Record(*args)
 
+  @profiling.timed("plans.take")
   def take(self, count=None, until=None, start=None):
     """
     starting from start, or now if omitted, generates up to count Records and
     returns them as Records
     """
+    if not count and not until and self.event[1]:
+      raise ValueError("taking from a recurring plan requires a count or until")
+    return list(islice(self.occurrences(until=until, start=start), count))
+
+  def occurrences(self, until=None, start=None):
+    """
+    lazily generates Records for the occurrences from start, or from now if
+    omitted, up to until, in timestamp order. without start, recurrences are
+    anchored at the start of the current day, which keeps them, and their uids,
+    the same all day.
+    """
     if until and not isinstance(until, datetime):
       until = parse_datetime(until)
     if start and not isinstance(start, datetime):
       start = parse_datetime(start)
 
+    since = start
     if start is None:
-      start = now()
+      start, since = today(), now()
 
-    r = RecurringEvent()
-    event = r.parse(self.schedule)
-    if r.is_recurring:
-      rr = rrulestr(event, dtstart=start)
-      if until:
-        dates = rr.between(after=start, before=until, count=count)
-      elif count:
-        dates = rr.xafter(start, count=count)
-      return [ self.occurrence(dt, index) for index, dt in enumerate(dates) ]
+    event, recurring = self.event
+    if recurring:
+      dates = compile_rule(event, start).xafter(start)
+      for index, dt in enumerate(dates):
+        if until and dt >= until:
+          return
+        if dt >= since:
+          yield self.occurrence(dt, index)
     elif isinstance(event, datetime):
-      if start and event < start:
-        return []
+      if event < since:
+        return
       if until and event > until:
-        return []
-      return [ Record(self.amount, self.description, event, self.uid) ]
-    elif event is None:
-      raise ValueError("schedule is invalid")
+        return
+      yield Record(self.amount, self.description, event, self.uid)
+
+  @property
+  def fingerprint(self):
+    """
+    a hash of everything that determines the occurrences, given a start
+    """
+    content = json.dumps([ self.schedule, str(self.amount), self.description, self.uids ])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+def expand(plan, start, after, until, index):
+  """
+  expands the occurrences of a recurring plan, anchored at start, after after,
+  up to and including the first one from until, numbering them from index.
+  returns them compactly, as their timestamps in microseconds since the epoch
+  and their uids, and whether the plan has no further occurrences.
+  """
+  event, _ = plan.event
+  timestamps = []
+  uids       = []
+  for position, dt in enumerate(compile_rule(event, start).xafter(after), index):
+    timestamps.append((dt - EPOCH) // MICROSECOND)
+    uids.append(plan.occurrence(dt, position).uid)
+    if dt >= until:
+      return timestamps, uids, False
+  return timestamps, uids, True
+
+def expand_batch(tasks):
+  """
+  expands a batch of plans, in a worker process
+  """
+  return [ expand(*task) for task in tasks ]
+
+class Occurrences:
+  """
+  caches the occurrences of recurring plans, per plan and start of the window
+  they are taken from, as that anchors their recurrence, so that each is only
+  expanded once. an entry is dropped when its plan's fingerprint changes, and
+  is extended when a later part of the window is taken. occurrences keep their
+  uid, which can be relative to the current day, e.g. "tomorrow", so the cache
+  only holds for the day it was made. optionally it is persisted to a file,
+  using writing. the pool of worker processes that expands plans in parallel
+  is started once and reused, since starting one costs more than expanding.
+  """
+  def __init__(self, path=None, writing=None):
+    self.path     = path
+    self.writing  = writing
+    self.changed  = False
+    self._day     = None
+    self._entries = {}    # plan uid@start -> [ fingerprint, Records, complete ]
+    self._stored  = None  # persisted entries, with (timestamp, uid) occurrences
+    self._pool    = None  # ( workers, ProcessPoolExecutor )
+
+  def entry(self, plan, start):
+    """
+    returns the entry for the plan and start, taking it from the persisted
+    entries, or starting a new one, if there is none for the current plan
+    """
+    day = today()
+    if self._stored is None or self._day != day:
+      self._day     = day
+      self._entries = {}
+      self._stored  = self.load(day)
+    key   = f"{plan.uid}@{start.isoformat()}"
+    entry = self._entries.get(key)
+    if entry is None and key in self._stored:
+      fingerprint, occurrences, complete = self._stored.pop(key)
+      entry = [ fingerprint, [
+        Record(plan.amount, plan.description, datetime.fromisoformat(timestamp), uid)
+        for timestamp, uid in occurrences
+      ], complete ]
+      self._entries[key] = entry
+    fingerprint = plan.fingerprint
+    if entry is None or entry[0] != fingerprint:
+      entry = self._entries[key] = [ fingerprint, [], False ]
+      self.changed = True
+    return entry
+
+  def load(self, day):
+    """
+    returns the persisted entries, if they were made on day
+    """
+    if not self.path:
+      return {}
+    try:
+      with open(self.path) as fp, profiling.span("occurrences.load"):
+        cache = json.load(fp)
+      if cache["day"] != day.isoformat():
+        return {}
+      return dict(cache["entries"])
+    except FileNotFoundError:
+      return {}
+    except (ValueError, KeyError, TypeError):
+      logger.warning(f"ignoring invalid occurrences cache {self.path}")
+      return {}
+
+  def save(self):
+    """
+    persists the cache, if it changed and has a file
+    """
+    if not self.changed or not self.path:
+      return
+    entries = dict(self._stored)
+    for key, (fingerprint, records, complete) in self._entries.items():
+      entries[key] = [
+        fingerprint,
+        [ (record.timestamp.isoformat(), record.uid) for record in records ],
+        complete
+      ]
+    try:
+      with self.writing(self.path) as fp, profiling.span("occurrences.save"):
+        json.dump({ "day" : self._day.isoformat(), "entries" : entries }, fp)
+      self.changed = False
+    except OSError as e:
+      logger.warning(f"could not save occurrences cache {self.path}: {e}")
+
+  def expand(self, plans, until, start=None, workers=2):
+    """
+    expands, in parallel, the occurrences of all recurring plans up to until
+    that aren't cached yet, using a pool of worker processes, and adds them to
+    the cache, from which they then are taken in timestamp order
+    """
+    if start is None:
+      start = today()
+    tasks   = []
+    entries = []
+    for plan in plans:
+      if not plan.event[1]:
+        continue
+      entry = self.entry(plan, start)
+      if entry[2] or (entry[1] and entry[1][-1].timestamp >= until):
+        continue
+      after = entry[1][-1].timestamp if entry[1] else start
+      tasks.append( (plan, start, after, until, len(entry[1])) )
+      entries.append( (plan, entry) )
+    if not tasks:
+      return
+
+    size    = -(-len(tasks) // (workers * 4)) # a few batches per worker
+    batches = [ tasks[index:index+size] for index in range(0, len(tasks), size) ]
+    with profiling.span("occurrences.expand"):
+      pool    = self.pool(workers)
+      results = [ result for batch in pool.map(expand_batch, batches) for result in batch ]
+
+    for (plan, entry), (timestamps, uids, complete) in zip(entries, results):
+      entry[1].extend(
+        Record(plan.amount, plan.description, EPOCH + timestamp * MICROSECOND, uid)
+        for timestamp, uid in zip(timestamps, uids)
+      )
+      entry[2] = complete
+      profiling.count("occurrences.expanded", len(timestamps))
+    self.changed = True
+
+  def pool(self, workers):
+    """
+    returns the pool of worker processes, starting it, or a new one if the
+    number of workers changed
+    """
+    if self._pool and self._pool[0] != workers:
+      self.close()
+    if not self._pool:
+      from concurrent.futures import ProcessPoolExecutor
+      self._pool = ( workers, ProcessPoolExecutor(workers) )
+    return self._pool[1]
+
+  def close(self):
+    """
+    shuts down the pool of worker processes, if one was started
+    """
+    if self._pool:
+      self._pool[1].shutdown()
+      self._pool = None
+
+  def saving(self, records):
+    """
+    generates the records and saves the cache once they are exhausted
+    """
+    try:
+      yield from records
+    finally:
+      self.save()
+
+  def occurrences(self, plan, until=None, start=None):
+    """
+    lazily generates Records for the occurrences of plan, like its occurrences
+    method, from the cache as far as possible, expanding and caching the rest
+    """
+    since = start
+    if start is None:
+      start, since = today(), now()
+    event, recurring = plan.event
+    if not recurring:
+      yield from plan.occurrences(until=until, start=since)
+      return
+
+    entry    = self.entry(plan, start)
+    cached   = entry[1]
+    position = 0
+    dates    = None # expansion of the rule after the cached occurrences
+    expanded = None # position up to where dates expanded the cache
+    while True:
+      if position == len(cached):
+        if entry[2]:
+          return
+        if dates is None or expanded != position: # (re)start after the cache
+          after = cached[-1].timestamp if cached else start
+          dates = compile_rule(event, start).xafter(after)
+        dt = next(dates, None)
+        if dt is None:
+          entry[2]     = True
+          self.changed = True
+          return
+        cached.append(plan.occurrence(dt, position))
+        self.changed = True
+        expanded     = position + 1
+        profiling.count("occurrences.expanded")
+      record    = cached[position]
+      position += 1
+      if until and record.timestamp >= until:
+        return
+      if record.timestamp >= since:
+        yield record
@@ -0,0 +1,170 @@
+"""
+optional instrumentation of the hot paths: timed spans and counters, that are
+only recorded when profiling is enabled, using the PROFILE environment variable
+or the --profile flag of the cli. a report can be written to stderr and all
+measurements can be appended as a JSON line to PROFILE_OUTPUT, or to the file
+passed as --profile=<file>.
+"""
+
+import os
+import sys
+import json
+import time
+
+from contextlib import nullcontext
+from functools  import wraps
+from datetime   import datetime
+
+import logging
+logger = logging.getLogger(__name__)
+
+PROFILE        = os.environ.get("PROFILE", "").lower() not in ("", "0", "no", "false")
+PROFILE_OUTPUT = os.environ.get("PROFILE_OUTPUT", None)
+
+FLAG = "--profile"
+
+class Span:
+  """
+  times a block of code and adds it to the named span of the profiler
+  """
+  __slots__ = ( "name", "profiler", "started" )
+
+  def __init__(self, profiler, name):
+    self.profiler = profiler
+    self.name     = name
+
+  def __enter__(self):
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.profiler.record(self.name, time.perf_counter() - self.started)
+    return False
+
+class Profiler:
+  """
+  collects the number of calls, total and maximum duration of named spans and
+  named counters. when disabled, spans are no-ops and counters are ignored.
+  """
+  def __init__(self, enabled=False, output=None):
+    self.enabled = enabled
+    self.output  = output
+    self.reset()
+
+  def reset(self):
+    self.spans    = {} # name -> [ count, total, max ]
+    self.counters = {} # name -> count
+    self.started  = time.perf_counter()
+
+  def enable(self, output=None):
+    self.enabled = True
+    if output:
+      self.output = output
+    return self
+
+  def disable(self):
+    self.enabled = False
+    return self
+
+  def span(self, name):
+    if self.enabled:
+      return Span(self, name)
+    return nullcontext()
+
+  def record(self, name, duration):
+    stats = self.spans.get(name)
+    if stats is None:
+      self.spans[name] = [ 1, duration, duration ]
+    else:
+      stats[0] += 1
+      stats[1] += duration
+      stats[2]  = max(stats[2], duration)
+
+  def count(self, name, amount=1):
+    if self.enabled:
+      self.counters[name] = self.counters.get(name, 0) + amount
+
+  def timed(self, name):
+    """
+    decorator that records every call of a function as a span
+    """
+    def decorator(func):
+      @wraps(func)
+      def wrapper(*args, **kwargs):
+        if not self.enabled:
+          return func(*args, **kwargs)
+        with Span(self, name):
+          return func(*args, **kwargs)
+      return wrapper
+    return decorator
+
+  def as_dict(self):
+    return {
+      "timestamp" : datetime.now().isoformat(timespec="seconds"),
+      "command"   : sys.argv[1:],
+      "duration"  : time.perf_counter() - self.started,
+      "spans"     : {
+        name : { "count" : count, "total" : total, "max" : longest }
+        for name, (count, total, longest) in self.spans.items()
+      },
+      "counters"  : dict(self.counters)
+    }
+
+  def report(self):
+    """
+    returns a human readable report, with the most time consuming spans first
+    """
+    lines = [
+      f"{'span':<28} {'calls':>9} {'total':>10} {'mean':>10} {'max':>10}"
+    ]
+    spans = sorted(self.spans.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (count, total, longest) in spans:
+      lines.append(
+        f"{name:<28} {count:>9} {total:>9.4f}s {total/count:>9.6f}s {longest:>9.4f}s"
+      )
+    if self.counters:
+      lines.append(f"{'counter':<28} {'count':>9}")
+      for name, count in sorted(self.counters.items()):
+        lines.append(f"{name:<28} {count:>9}")
+    lines.append(f"total {time.perf_counter() - self.started:.4f}s")
+    return "\n".join(lines)
+
+  def dump(self, path=None):
+    """
+    appends all measurements as a single JSON line to a file
+    """
+    path = path or self.output
+    with open(path, "a") as fp:
+      fp.write(json.dumps(self.as_dict()) + "\n")
+    logger.debug(f"appended profile to {path}")
+
+  def finish(self, fp=sys.stderr):
+    """
+    writes the report, and the dump if an output was configured
+    """
+    if not self.enabled:
+      return
+    fp.write(self.report() + "\n")
+    if self.output:
+      self.dump()
+
+profiler = Profiler(enabled=PROFILE, output=PROFILE_OUTPUT)
+
+span  = profiler.span
+count = profiler.count
+timed = profiler.timed
+
+def from_args(args):
+  """
+  enables profiling if the --profile(=<file>) flag is present and returns the
+  arguments without it
+  """
+  remaining = []
+  for arg in args:
+    if arg == FLAG:
+      profiler.enable()
+    elif arg.startswith(f"{FLAG}="):
+      profiler.enable(output=arg.split("=", 1)[1])
+    else:
+      remaining.append(arg)
+  return remaining
@@ -1,17 +1,55 @@
 from dataclasses import dataclass, field
 
+import sys
+import re
 from datetime import datetime
 import uuid
 from decimal import Decimal, getcontext
-import humanize
 
-from fintrack.utils import now, uid, parse_amount, parse_datetime
+from fintrack.utils import now, uid, parse_amount, parse_datetime, slotted
+from fintrack.utils import naturalday
 
 import logging
 logger = logging.getLogger(__name__)
 
 getcontext().prec = 2
 
+CANONICAL_UUID = re.compile(
+  r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
+)
+
+class CompactUid:
+  """
+  descriptor for uids, storing canonical uuid strings as their 16 bytes, which
+  takes less than half the memory, and any other uid as is
+  """
+  def __set_name__(self, owner, name):
+    self.slot = f"_{name}"
+
+  def __get__(self, obj, cls=None):
+    if obj is None:
+      return None # the default, a new uid is assigned in __post_init__
+    value = getattr(obj, self.slot)
+    if isinstance(value, bytes):
+      value = value.hex()
+      return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+    return value
+
+  def __set__(self, obj, value):
+    setattr(obj, self.slot, self.compact(value))
+
+  @staticmethod
+  def compact(value):
+    """
+    returns the value as it is stored, e.g. to use it as a key
+    """
+    if isinstance(value, uuid.UUID):
+      return value.bytes
+    if isinstance(value, str) and CANONICAL_UUID.match(value):
+      return bytes.fromhex(value.replace("-", ""))
+    return value
+
+@slotted()
 @dataclass
 class RecordLike:
   """
@@ -21,19 +59,21 @@ class RecordLike:
   amount      : Decimal
   description : str
 
+@slotted("_uid")
 @dataclass
 class Record(RecordLike):
   """
   represents some financial transaction, consisting of an amount and
   description, with timestamp and unique identifier, defaulting to now and a
-  random uuid
+  random uuid. records are slotted, descriptions are interned and uuids are
+  kept as bytes, to keep large sheets compact in memory.
   """
   amount      : Decimal
   description : str
 
   # optional
   timestamp   : datetime = field(default_factory=now)
-  uid         : str      = field(default_factory=uid)
+  uid         : str      = CompactUid()
   
   # exposed columns in prefered presentation order
   columns = ( "timestamp", "amount", "description", "uid" )
@@ -46,13 +86,13 @@ class Record(RecordLike):
       self.amount = parse_amount(self.amount)
     if not isinstance(self.timestamp, datetime):
       self.timestamp = parse_datetime(self.timestamp)
+    if isinstance(self.description, str):
+      self.description = sys.intern(self.description)
     if self.uid is None:
       self.uid = uid()
-    if isinstance(self.uid, uuid.UUID):
-      self.uid = str(self.uid)
   
   def __repr__(self):
-    return f"record for {self.amount} {humanize.naturalday(self.timestamp)} {self.description}"
+    return f"record for {self.amount} {naturalday(self.timestamp)} {self.description}"
   
   def __lt__(self, other):
     return self.timestamp < other.timestamp
@@ -0,0 +1,123 @@
+import re
+
+from fintrack.columnar import numpy
+
+import logging
+logger = logging.getLogger(__name__)
+
+PERIODS = {
+  "day"   : "datetime64[D]",
+  "week"  : "datetime64[D]",
+  "month" : "datetime64[M]",
+  "year"  : "datetime64[Y]"
+}
+
+class Report:
+  """
+  aggregates the amounts of records by period and/or by description pattern,
+  computing their count, sum, min, max and average, using NumPy on the
+  columnar arrays of a sheet. it provides columns and rows, like a sheet.
+  """
+  def __init__(self, columns, by="month", pattern=None):
+    numpy()
+    if by is not None and by not in PERIODS:
+      raise ValueError(f"unknown period: {by}, options: {list(PERIODS)}")
+    self.by      = by
+    self.pattern = pattern
+    self._rows   = self.aggregate(columns)
+
+  @property
+  def columns(self):
+    columns = [ "count", "sum", "min", "max", "average" ]
+    if self.pattern is not None:
+      columns.insert(0, "match")
+    if self.by is not None:
+      columns.insert(0, self.by)
+    return tuple(columns)
+
+  @property
+  def rows(self):
+    for row in self._rows:
+      yield list(row)
+
+  def __iter__(self):
+    return self.rows
+
+  def __len__(self):
+    return len(self._rows)
+
+  def periods(self, timestamps):
+    """
+    returns the start of the period of each timestamp, as int64
+    """
+    np = numpy()
+    periods = timestamps.astype("datetime64[us]").astype(PERIODS[self.by])
+    if self.by == "week": # move back to the monday, 1970-01-01 was a thursday
+      periods = periods - (periods.astype(np.int64) + 3) % 7
+    return periods.astype(np.int64)
+
+  def matches(self, descriptions):
+    """
+    returns the index of the matched part of each description, -1 if there is
+    no match, along with the list of matched parts
+    """
+    np = numpy()
+    regex   = re.compile(self.pattern)
+    matched = {}
+    indexes = []
+    for description in descriptions.tolist():
+      match = regex.search(description)
+      if match:
+        part = match.group(1) if regex.groups else match.group(0)
+        indexes.append(matched.setdefault(part, len(matched)))
+      else:
+        indexes.append(-1)
+    return np.array(indexes, dtype=np.int64), list(matched.keys())
+
+  def aggregate(self, columns):
+    np = numpy()
+    amounts = columns["amount"]
+    keys    = []
+    if self.by is not None:
+      keys.append(self.periods(columns["timestamp"]))
+    if self.pattern is not None:
+      indexes, parts = self.matches(columns["descriptions"])
+      labels  = indexes[columns["description"]]
+      matched = labels >= 0
+      amounts = amounts[matched]
+      labels  = labels[matched]
+      keys    = [ key[matched] for key in keys ] + [ labels ]
+    if not len(amounts):
+      return []
+
+    # sort by the keys and find the boundaries of the groups
+    if keys:
+      order   = np.lexsort(keys[::-1])
+      amounts = amounts[order]
+      keys    = [ key[order] for key in keys ]
+      changes = np.zeros(len(amounts), dtype=bool)
+      changes[0] = True
+      for key in keys:
+        changes[1:] |= key[1:] != key[:-1]
+      starts = np.flatnonzero(changes)
+    else:
+      starts = np.array([ 0 ])
+
+    scale  = 10.0 ** int(columns["scale"])
+    counts = np.diff(np.append(starts, len(amounts)))
+    sums   = np.add.reduceat(amounts, starts) / scale
+    mins   = np.minimum.reduceat(amounts, starts) / scale
+    maxs   = np.maximum.reduceat(amounts, starts) / scale
+    avgs   = sums / counts
+
+    labels = []
+    if self.by is not None:
+      unit = "datetime64[D]" if self.by == "week" else PERIODS[self.by]
+      labels.append([ str(period) for period in keys[0][starts].astype(unit) ])
+    if self.pattern is not None:
+      labels.append([ parts[index] for index in keys[-1][starts].tolist() ])
+
+    return list(zip(
+      *labels,
+      counts.tolist(), sums.tolist(), mins.tolist(), maxs.tolist(), avgs.tolist()
+    ))
@@ -0,0 +1,255 @@
+"""
+SQLite storage for books: all sheets are tables in a single database. sheets of
+records aren't loaded, but queried when needed, using indexes on their
+timestamp and uid, so memory use doesn't grow with the history. the (few)
+plans are kept in memory and written through to their table.
+"""
+
+import sqlite3
+
+from datetime import datetime
+from decimal import Decimal
+
+from fintrack.books    import SheetLike, Sheet, PlannedSheet, BalancedSheet
+from fintrack.records  import Record
+from fintrack.plans    import PlannedRecord
+from fintrack.columnar import EPOCH, MICROSECOND
+from fintrack.utils    import parse_datetime, DECIMAL_CONTEXT
+from fintrack          import profiling
+
+import logging
+logger = logging.getLogger(__name__)
+
+DATABASE = "book.sqlite"
+
+# seconds a writer waits for another writer to finish its transaction
+TIMEOUT = 30
+
+def connect(path):
+  """
+  opens the database, in WAL mode, which allows readers while writing
+  """
+  db = sqlite3.connect(path, timeout=TIMEOUT)
+  db.execute("PRAGMA journal_mode=WAL")
+  db.execute("PRAGMA synchronous=NORMAL")
+  return db
+
+def quote(identifier):
+  return '"' + identifier.replace('"', '""') + '"'
+
+def sheet(db, name, cls):
+  """
+  returns a sheet of the given class, stored in the named table
+  """
+  if issubclass(cls, PlannedSheet):
+    return SqlitePlannedSheet(db, name)
+  if issubclass(cls, Sheet):
+    return SqliteSheet(db, name)
+  raise ValueError(f"{cls.__name__} sheets can't be stored in sqlite")
+
+def timestamp(value):
+  if value.tzinfo:
+    raise ValueError("sqlite sheets only support naive timestamps")
+  return (value - EPOCH) // MICROSECOND
+
+class SqliteSheet(SheetLike):
+  """
+  a sheet of Records in a table, indexed on timestamp and uid. records are
+  ordered by timestamp and, for equal timestamps, in order of addition.
+  """
+  def __init__(self, db, name):
+    self._db    = db
+    self._table = quote(name)
+    with self._db:
+      self._db.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self._table} (
+          timestamp   INTEGER NOT NULL,
+          amount      TEXT    NOT NULL,
+          description TEXT,
+          uid         TEXT
+        )""")
+      self._db.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote(name + '_timestamp')} "
+        f"ON {self._table} (timestamp)"
+      )
+      self._db.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote(name + '_uid')} ON {self._table} (uid)"
+      )
+    self.balanced = BalancedSheet(self)
+
+  @property
+  def type(self):
+    return Record
+
+  def row(self, record):
+    return (
+      timestamp(record.timestamp), str(record.amount), record.description, record.uid
+    )
+
+  def select(self, where="", params=(), limit=None, offset=None):
+    """
+    generates the records matching the where clause, in order, from the offset
+    """
+    query = f"SELECT timestamp, amount, description, uid FROM {self._table} {where} " \
+             "ORDER BY timestamp, rowid"
+    if limit is not None or offset:
+      query += " LIMIT ? OFFSET ?"
+      params = (*params, -1 if limit is None else limit, offset or 0)
+    for micros, amount, description, uid in self._db.execute(query, params):
+      yield Record(Decimal(amount), description, EPOCH + micros * MICROSECOND, uid)
+
+  def __iter__(self):
+    return self.select()
+
+  def __len__(self):
+    return self._db.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return super().__getitem__(index)
+    position = index + len(self) if index < 0 else index
+    if position >= 0:
+      for record in self.select(limit=1, offset=position):
+        return record
+    raise IndexError("sheet index out of range")
+
+  def add(self, *args, **kwargs):
+    record = self.record(*args, **kwargs)
+    with self._db, profiling.span("sheet.insert"):
+      self._db.execute(
+        f"INSERT INTO {self._table} VALUES (?, ?, ?, ?)", self.row(record)
+      )
+    profiling.count("sheet.inserted")
+    return record
+
+  def get(self, uid, default=None):
+    # optimization over the generic version on SheetLike, using the uid index
+    for record in self.select("WHERE uid = ?", (uid,), limit=1):
+      return record
+    return default
+
+  def remove(self, uid):
+    """
+    removes the record with the given uid and returns it, or raises a KeyError
+    if there is no such record. of records with the same uid, only the one that
+    get returns is removed.
+    """
+    record = self.get(uid)
+    if record is None:
+      raise KeyError(uid)
+    with self._db:
+      self._db.execute(
+        f"DELETE FROM {self._table} WHERE rowid = ("
+        f"SELECT rowid FROM {self._table} WHERE uid = ? ORDER BY timestamp, rowid LIMIT 1)",
+        (uid,)
+      )
+    return record
+
+  def update(self, other):
+    """
+    inserts all records in a single transaction
+    """
+    records = [ self.record(record) for record in other ]
+    with self._db, profiling.span("sheet.insert"):
+      self._db.executemany(
+        f"INSERT INTO {self._table} VALUES (?, ?, ?, ?)",
+        [ self.row(record) for record in records ]
+      )
+    profiling.count("sheet.inserted", len(records))
+
+  def take(self, count=None, until=None, start=None):
+    """
+    optimization over the generic version on SheetLike, scanning the range of
+    the timestamp index
+    """
+    if until and not isinstance(until, datetime):
+      until = parse_datetime(until)
+    if start and not isinstance(start, datetime):
+      start = parse_datetime(start)
+    clauses = []
+    params  = []
+    if start:
+      clauses.append("timestamp >= ?")
+      params.append(timestamp(start))
+    if until:
+      clauses.append("timestamp <= ?")
+      params.append(timestamp(until))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return self.select(where, params, limit=count or None)
+
+  def total(self, first=0, last=None):
+    """
+    returns the exact sum of the amounts of the records from first to last
+    (exclusive) position, only fetching their amounts
+    """
+    limit = -1 if last is None else max(last - first, 0)
+    total = Decimal(0)
+    for (amount,) in self._db.execute(
+      f"SELECT amount FROM {self._table} ORDER BY timestamp, rowid LIMIT ? OFFSET ?",
+      (limit, first)
+    ):
+      total = DECIMAL_CONTEXT.add(total, Decimal(amount))
+    return total
+
+  def slice(self, first=0, last=None):
+    # optimization over the generic version on SheetLike
+    limit = None if last is None else max(last - first, 0)
+    return self.select(limit=limit, offset=first)
+
+class SqlitePlannedSheet(PlannedSheet):
+  """
+  a PlannedSheet that keeps its plans in memory, as they are few, and writes
+  them through to a table, indexed on uid
+  """
+  def __init__(self, db, name):
+    self._db    = db
+    self._table = quote(name)
+    with self._db:
+      self._db.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self._table} (
+          schedule    TEXT NOT NULL,
+          amount      TEXT NOT NULL,
+          description TEXT,
+          uids        TEXT,
+          uid         TEXT
+        )""")
+      self._db.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote(name + '_uid')} ON {self._table} (uid)"
+      )
+    super().__init__()
+    super().update(
+      PlannedRecord(Decimal(amount), description, schedule, uids, uid)
+      for schedule, amount, description, uids, uid in self._db.execute(
+        f"SELECT schedule, amount, description, uids, uid FROM {self._table} "
+         "ORDER BY rowid"
+      )
+    )
+
+  def row(self, plan):
+    return ( plan.schedule, str(plan.amount), plan.description, plan.uids, plan.uid )
+
+  def add(self, *args, **kwargs):
+    plan = super().add(*args, **kwargs)
+    with self._db:
+      self._db.execute(f"INSERT INTO {self._table} VALUES (?, ?, ?, ?, ?)", self.row(plan))
+    return plan
+
+  def remove(self, uid):
+    plan = super().remove(uid)
+    with self._db: # only the row of this plan, not others with the same uid
+      self._db.execute(
+        f"DELETE FROM {self._table} WHERE rowid = ("
+        f"SELECT rowid FROM {self._table} WHERE schedule = ? AND amount = ? "
+         "AND description IS ? AND uids IS ? AND uid IS ? ORDER BY rowid LIMIT 1)",
+        self.row(plan)
+      )
+    return plan
+
+  def update(self, other):
+    plans = [ self.record(plan) for plan in other ]
+    super().update(plans)
+    with self._db:
+      self._db.executemany(
+        f"INSERT INTO {self._table} VALUES (?, ?, ?, ?, ?)",
+        [ self.row(plan) for plan in plans ]
+      )
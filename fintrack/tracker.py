@@ -1,10 +1,15 @@
 import sys
+import os
 
 import logging
 
+from datetime import datetime
+from decimal  import Decimal
+
 from fintrack            import __version__
-from fintrack.books      import Book, Sheet
+from fintrack.books      import Book, Sheet, SheetExtract, DynamicSheet, SLURP_BATCH
 from fintrack.ui.tabular import Tabular, positive_green, negative_red
+from fintrack.utils      import parse_datetime, DECIMAL_CONTEXT
 
 logger = logging.getLogger(__name__)
 
@@ -47,22 +52,41 @@ class Tracker:
   def future(self, until="next month"):
     """
     future generates records from the planned records
-    TODO: generalize
     """
-    self._sheet = Sheet()
-    for plan in self._book._sheets["plans"]:
-      self._sheet = self._sheet + Sheet(plan.take(until=until))
+    self._sheet = DynamicSheet().include(self._book._sheets["plans"], until=until)
+    return self
+
+  def window(self, start=None, until=None):
+    """
+    restricts the current sheet to the records from start up to until. if it
+    isn't loaded yet, only the part of the sheet up to until is read. the
+    records before start are summed into the opening balance of the window.
+    e.g. fintrack window --until 1/1/2024 - table
+    """
+    if self._sheet:
+      self._sheet = SheetExtract(self._sheet, start=start, until=until)
+      return self
+    if start and not isinstance(start, datetime):
+      start = parse_datetime(start)
+    opening = Decimal(0)
+    records = []
+    for record in self._book.scan(until=until):
+      if start and record.timestamp < start:
+        opening = DECIMAL_CONTEXT.add(opening, record.amount)
+      else:
+        records.append(record)
+    self._sheet = Sheet(records)
+    self._sheet.balanced.opening = opening
     return self
 
   @property
   def overview(self):
     """
     overview is a ready-made composite sheet of records and the future
-    TODO: generalize
     """
-    self._sheet = self._book._sheets["records"]
-    for plan in self._book._sheets["plans"]:
-      self._sheet = self._sheet + Sheet(plan.take(until="next month"))
+    self._sheet = DynamicSheet() \
+                    .include(self._book._sheets["records"]) \
+                    .include(self._book._sheets["plans"], until="next month")
     return self
 
   @property
@@ -70,7 +94,15 @@ class Tracker:
     """
     makes the balanced version of the current sheet active
     """
-    self._sheet = self.book.sheet.balanced
+    self._sheet = self.current_sheet.balanced
+    return self
+
+  def report(self, by="month", pattern=None):
+    """
+    aggregates the current sheet by period (day, week, month or year) and/or
+    by the part of the description that matches a regular expression pattern
+    """
+    self._sheet = self.current_sheet.report(by=by, pattern=pattern)
     return self
 
   @property
@@ -80,10 +112,24 @@ class Tracker:
     """
     rules = {
       "amount" : [ positive_green, negative_red ],
-      "balance": [ negative_red ]
+      "balance": [ negative_red ],
+      "sum"    : [ positive_green, negative_red ]
     }
     return Tabular(self.current_sheet, colorize=rules)
 
+  def show(self, head=None, tail=None, offset=None):
+    """
+    streams the current sheet as a table to the terminal, page by page,
+    optionally only showing the head and/or tail, from an offset
+    """
+    table = self.table
+    table.head, table.tail, table.offset = head, tail, offset
+    try:
+      table.stream(sys.stdout)
+    except BrokenPipeError: # e.g. when piped to head or less, that quits early
+      # silence the final flush of stdout, keeping stderr open, e.g. for profiles
+      os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
   # storage
 
   def use(self, folder):
@@ -98,13 +144,34 @@ class Tracker:
     self._book.save()
     return self
 
+  def convert(self, sheet, format="columnar"):
+    """
+    converts a sheet to another storage format, e.g. columnar or json
+    """
+    self._book.convert(sheet, format=format)
+    return self
+
   # record management
 
-  def add(self, *args, **kwargs):
-    self._book.add(*args, **kwargs)
+  def add(self, *args, existing="add", **kwargs):
+    """
+    adds a record, or when its uid is already known, skips it or updates the
+    known one, with existing set to skip or update
+    """
+    self._book.add(*args, existing=existing, **kwargs)
+
+  def slurp(self, source=sys.stdin, batch=SLURP_BATCH, existing="add"):
+    """
+    imports tab separated rows, with existing set to skip or update, rows that
+    were already imported are skipped or update the known record
+    """
+    self._book.slurp(source=source, batch=batch, existing=existing)
+
+  def remove(self, uid):
+    self._book.remove(uid)
 
-  def slurp(self, source=sys.stdin):
-    self._book.slurp(source=source)
+  def replace(self, uid, *args, **kwargs):
+    self._book.replace(uid, *args, **kwargs)
 
   # iterator support, making Tracker a list of what's on its current sheet
 
@@ -1,40 +1,220 @@
-from tabulate import tabulate
+import sys
+import re
+import numbers
+
+from itertools import islice, chain
+
 from colorama import Fore, Style, init
 
+from fintrack import profiling
+
 import logging
 logger = logging.getLogger(__name__)
 
 # reset coloring in between prints
 init(autoreset=True)
 
+# number of rows that are written before flushing the output
+PAGE_SIZE   = 50
+
+# number of rows used to compute the layout of a streamed table
+SAMPLE_SIZE = 1000
+
+# color codes are invisible and don't count towards the width of cells
+INVISIBLE = re.compile(r"\x1b\[\d+(;\d+)*m")
+
 class Tabular:
   """
   given a sheet, visualize it as a table, adding color according to
-  provided rules { key, [fun(value)->color)] }
+  provided rules { key, [fun(value)->color)] }. optionally only a window of the
+  sheet is visualized: from offset onwards, its head and/or tail.
   """
-  def __init__(self, sheet, colorize=None):
+  def __init__(self, sheet, colorize=None, head=None, tail=None, offset=None):
     self.sheet    = sheet
     self.colorize = colorize if colorize else {}
     self.mapping = { key:index for index, key in enumerate(self.sheet.columns) }
+    self.head     = head
+    self.tail     = tail
+    self.offset   = offset
+
+  @property
+  def rows(self):
+    """
+    the rows of the window on the sheet, pushing the window down into the sheet
+    """
+    first = self.offset or 0
+    last  = None
+    if self.tail:
+      first = max(first, len(self.sheet) - self.tail)
+    if self.head:
+      last = first + self.head
+    if not first and last is None:
+      return self.sheet.rows
+    try:
+      return self.sheet.slice_rows(first, last)
+    except AttributeError:
+      return islice(self.sheet.rows, first, last)
+
+  def colors(self, row):
+    """
+    returns the color for each value in the row, according to the rules
+    """
+    colors = [ None ] * len(row)
+    for key, rules in self.colorize.items():
+      index = self.mapping.get(key, None)
+      if index is None:
+        continue
+      for rule in rules:
+        color = rule(row[index])
+        if color:
+          colors[index] = color
+    return colors
 
   def colorized(self, row):
-    if self.colorize:
-      for key, rules in self.colorize.items():
-        for rule in rules:
-          try:
-            index = self.mapping[key]
-            color = rule(row[index])
-            if color:
-              row[index] = color + str(row[index]) + Style.RESET_ALL
-          except KeyError:
-            pass
+    for index, color in enumerate(self.colors(row)):
+      if color:
+        row[index] = color + str(row[index]) + Style.RESET_ALL
     return row
-    
+
+  @profiling.timed("table.render")
   def __str__(self):
+    from tabulate import tabulate
     return tabulate( [
-      self.colorized(row) for row in self.sheet.rows
+      self.colorized(row) for row in self.rows
     ], self.sheet.columns, tablefmt="grid" )
 
+  @profiling.timed("table.stream")
+  def stream(self, fp=sys.stdout, page=PAGE_SIZE, sample=SAMPLE_SIZE, widths=None):
+    """
+    writes the table to fp, page by page, without materializing all rows. the
+    layout is computed from a sample of the first rows, or from precomputed
+    widths by column name. wider values, beyond the sample, don't get cut off.
+    """
+    rows    = iter(self.rows)
+    sampled = list(islice(rows, sample))
+    layout  = Layout(self.sheet.columns, sampled, widths=widths)
+    fp.write(layout.border("-") + "\n")
+    fp.write(layout.header() + "\n")
+    fp.write(layout.border("=") + "\n")
+    for count, row in enumerate(chain(sampled, rows), 1):
+      fp.write(layout.line(row, self.colors(row)) + "\n")
+      fp.write(layout.border("-") + "\n")
+      if count % page == 0:
+        fp.flush()
+    if not sampled:
+      fp.write(layout.border("-") + "\n")
+    fp.flush()
+
+class Layout:
+  """
+  the layout of a grid table, like tabulate's grid format: column widths,
+  alignment and decimal point positions, computed from a sample of rows
+  """
+  def __init__(self, columns, rows, widths=None):
+    self.columns  = list(columns)
+    values        = list(zip(*rows)) if rows else [ () for _ in self.columns ]
+    self.numeric  = [
+      bool(column) and all(is_number(value) for value in column if value is not None)
+      for column in values
+    ]
+    self.decimals = [ -1 ] * len(self.columns)
+    for index, column in enumerate(values):
+      if self.numeric[index]:
+        self.decimals[index] = max(
+          [ afterpoint(self.text(value, index, aligned=False)) for value in column ]
+        )
+    self.widths = [ len(column) + 2 for column in self.columns ]
+    for index, column in enumerate(values):
+      for value in column:
+        self.widths[index] = max(self.widths[index], width(self.text(value, index)))
+    if widths:
+      self.widths = [
+        widths.get(column, current) for column, current in zip(self.columns, self.widths)
+      ]
+
+  def text(self, value, index, aligned=True, color=None):
+    """
+    formats a value, aligning numbers on their decimal point
+    """
+    return self.formatted(value, index, aligned=aligned, color=color)[0]
+
+  def formatted(self, value, index, aligned=True, color=None):
+    """
+    formats a value and tells if it is a number. values beyond the sample that
+    aren't numbers, in a numeric column, are kept as they are.
+    """
+    if value is None:
+      return "", False
+    text    = str(value)
+    numeric = self.numeric[index]
+    if numeric:
+      plain = INVISIBLE.sub("", text)
+      try:
+        number = float(plain)
+        if "." in plain or "e" in plain:
+          text = format(number, "g")
+      except ValueError:
+        numeric = False
+    if color:
+      text = color + text + Style.RESET_ALL
+    if aligned and numeric:
+      text += " " * (self.decimals[index] - afterpoint(text))
+    return text, numeric
+
+  def cell(self, text, index, numeric=None):
+    """
+    pads the text to the width of the column, numbers to the right
+    """
+    if numeric is None:
+      numeric = self.numeric[index]
+    padding = " " * max(0, self.widths[index] - width(text))
+    return padding + text if numeric else text + padding
+
+  def border(self, char):
+    return "+" + "+".join( [ char * (width + 2) for width in self.widths ] ) + "+"
+
+  def header(self):
+    return "| " + " | ".join( [
+      self.cell(column, index) for index, column in enumerate(self.columns)
+    ] ) + " |"
+
+  def line(self, row, colors=None):
+    colors = colors or [ None ] * len(row)
+    cells  = []
+    for index, value in enumerate(row):
+      text, numeric = self.formatted(value, index, color=colors[index])
+      cells.append(self.cell(text, index, numeric=numeric))
+    return "| " + " | ".join(cells) + " |"
+
+def width(text):
+  return len(INVISIBLE.sub("", text))
+
+def is_number(value):
+  if isinstance(value, bool):
+    return False
+  if isinstance(value, numbers.Number):
+    return True
+  try:
+    float(INVISIBLE.sub("", str(value)))
+    return True
+  except ValueError:
+    return False
+
+def afterpoint(text):
+  """
+  number of characters after the decimal point, or -1 for integers
+  """
+  text = INVISIBLE.sub("", text)
+  try:
+    int(text)
+    return -1
+  except ValueError:
+    pass
+  position = text.rfind(".")
+  if position < 0:
+    position = text.lower().rfind("e")
+  return len(text) - position - 1 if position >= 0 else -1
+
 def positive_green(value):
   try:
     if value > 0:
@@ -4,16 +4,17 @@ import re
 
 from dataclasses import is_dataclass, asdict, fields
 from collections.abc import Iterable
+from functools import cache, lru_cache
+from operator  import attrgetter
 
 import json
 
-from dateparser import parse
-from datetime import datetime
+from datetime import datetime, time
 import uuid
 import numbers
-from decimal import Decimal
+from decimal import Decimal, Context
 
-import humanize
+from fintrack import profiling
 
 import logging
 logger = logging.getLogger(__name__)
@@ -23,18 +24,78 @@ if DATE_ORDER:
   logger.debug(f"using a date order {DATE_ORDER}")
 
 DATE_LANG = os.environ.get("DATE_LANG", None)
-if DATE_LANG:
-  humanize.i18n.activate(DATE_LANG)
-  logger.debug(f"using date language {DATE_LANG}")
 
 DECIMAL_POINT = os.environ.get("DECIMAL_POINT", ",")
 
+# context for calculations that shouldn't be limited by the global precision
+DECIMAL_CONTEXT = Context(prec=38)
+
+PARSE_CACHE_SIZE = int(os.environ.get("PARSE_CACHE_SIZE", "4096"))
+
+# relative phrases that depend on the time of day, and thus aren't cached
+SUB_DAY = re.compile(
+  r"\bnow\b|\b(?:\d+|an?)\s*(?:seconds?|secs?|minutes?|mins?|hours?|hrs?)\b", re.IGNORECASE
+)
+
+# number of characters read at once while streaming JSON
+STREAM_CHUNK = 65536
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+SEPARATOR  = re.compile(r"[ \t\n\r]*,[ \t\n\r]*")
+
+# strict numeric date(time) formats, e.g. 7/6, 7-6-19, 07.06.2019 12:00 or
+# 2019-07-06T10:20:30.123, with day and month ordered according to DATE_ORDER
+TIME_FORMAT = r"(?:[ T](?P<hour>\d{1,2}):(?P<minute>\d{2})" \
+              r"(?::(?P<second>\d{2})(?:\.(?P<fraction>\d{1,6}))?)?)?$"
+YEAR_LAST   = re.compile(
+  r"^(?P<first>\d{1,2})(?P<sep>[/.-])(?P<last>\d{1,2})"
+  r"(?:(?P=sep)(?P<year>\d{4}|\d{2}))?" + TIME_FORMAT
+)
+YEAR_FIRST  = re.compile(
+  r"^(?P<year>\d{4})(?P<sep>[/.-])(?P<first>\d{1,2})(?P=sep)(?P<last>\d{1,2})"
+  + TIME_FORMAT
+)
+
+# heavy dependencies, such as dateparser and humanize, are only imported when
+# they are actually needed, to keep the startup of the cli fast
+
+@cache
+def humanizer():
+  """
+  imports humanize, activating the DATE_LANG, on first use
+  """
+  import humanize
+  if DATE_LANG:
+    humanize.i18n.activate(DATE_LANG)
+    logger.debug(f"using date language {DATE_LANG}")
+  return humanize
+
+def naturalday(value):
+  return humanizer().naturalday(value)
+
 def now():
   return datetime.now() # wrapped to be able to monkeypatch it in tests
 
+def today():
+  """
+  the start of the current day
+  """
+  return now().replace(hour=0, minute=0, second=0, microsecond=0)
+
 def uid():
   return str(uuid.uuid4()) # wrapped to be able to monkeypatch it in tests
 
+# namespace for derived uids
+UID_NAMESPACE = uuid.UUID("b25f1eed-cb42-4bda-b8a8-6f6e903df680")
+
+def derived_uid(*values):
+  """
+  returns a uid that is derived from the values, and thus the same every time,
+  e.g. to recognize records that are imported again
+  """
+  return str(uuid.uuid5(UID_NAMESPACE, "\t".join(str(value) for value in values)))
+
+@profiling.timed("parse_amount")
 def parse_amount(amount):
   if not isinstance(amount, numbers.Number):
     # remove everything that shouldn't be in there
@@ -44,8 +105,70 @@ def parse_amount(amount):
       amount = re.sub(DECIMAL_POINT, ".", re.sub(r'[^\d'+f"{DECIMAL_POINT}-]","", amount))
   return Decimal(amount)
 
+@profiling.timed("parse_datetime")
 def parse_datetime(dt_str):
-  return parse(dt_str, settings={"DATE_ORDER": DATE_ORDER})
+  """
+  parses a string into a datetime, trying strict numeric formats first and
+  falling back to dateparser. results are cached for the current day, with
+  relative phrases like "next month" taken from the start of the day. phrases
+  within the day, like "now" or "in 2 hours", are parsed again every time.
+  """
+  if SUB_DAY.search(dt_str):
+    return dateparse(dt_str, now())
+  return cached_parse_datetime(dt_str, now().date())
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def cached_parse_datetime(dt_str, today):
+  parsed = fast_parse_datetime(dt_str, today)
+  if parsed is None:
+    parsed = dateparse(dt_str, datetime.combine(today, time()))
+  return parsed
+
+def dateparse(dt_str, base):
+  with profiling.span("dateparser"):
+    from dateparser import parse
+    return parse(dt_str, settings={"DATE_ORDER": DATE_ORDER, "RELATIVE_BASE": base})
+
+def parse_cache_info():
+  """
+  returns hits, misses, maxsize and currsize of the datetime parsing cache
+  """
+  return cached_parse_datetime.cache_info()
+
+def fast_parse_datetime(dt_str, today):
+  """
+  parses strict numeric formats, following DATE_ORDER like dateparser does,
+  also for year first formats. returns None if the string doesn't match.
+  """
+  if not isinstance(dt_str, str):
+    return None
+  order = DATE_ORDER.replace("Y", "")
+  if DATE_ORDER.endswith("Y"):
+    match = YEAR_LAST.match(dt_str) or YEAR_FIRST.match(dt_str)
+  else:
+    match = YEAR_FIRST.match(dt_str)
+  if not match:
+    return None
+  parts = match.groupdict()
+  if order == "DM":
+    day, month = parts["first"], parts["last"]
+  else:
+    month, day = parts["first"], parts["last"]
+  year = parts["year"]
+  if year is None:
+    year = today.year
+  elif len(year) == 2:
+    year = int(year) + (1900 if int(year) >= 69 else 2000)
+  try:
+    return datetime(
+      int(year), int(month), int(day),
+      int(parts["hour"]   or 0),
+      int(parts["minute"] or 0),
+      int(parts["second"] or 0),
+      int((parts["fraction"] or "0").ljust(6, "0"))
+    )
+  except ValueError:
+    return None # e.g. 13/13, leave it up to dateparser
 
 class ClassEncoder(json.JSONEncoder):
   def default(self, obj):
@@ -70,9 +193,66 @@ def ClassDecoder(cls):
       for key, value in dct.items():
         if self.types.get(key, None) is datetime:
           dct[key] = datetime.fromisoformat(value)
+      profiling.count("decoder.objects")
       return self.cls(**dct)
   return WrappedClassDecoder
 
+def iterdecode(fp, cls, chunk=STREAM_CHUNK):
+  """
+  generates the objects of a JSON array in a file as instances of cls, one at
+  a time, only keeping the text of the current chunk(s) of the file in memory
+  """
+  decoder  = ClassDecoder(cls)()
+  buffer   = ""
+  position = 0
+
+  def peek():
+    """
+    returns the next non-whitespace character, reading more text if needed
+    """
+    nonlocal buffer, position
+    while True:
+      position = WHITESPACE.match(buffer, position).end()
+      if position < len(buffer):
+        return buffer[position]
+      more = fp.read(chunk)
+      if not more:
+        raise json.JSONDecodeError("unexpected end of JSON array", buffer, position)
+      buffer, position = more, 0
+
+  if peek() != "[":
+    raise json.JSONDecodeError("expected a JSON array", buffer, position)
+  position += 1
+  if peek() == "]":
+    return
+  scan      = decoder.scan_once # raw_decode, without its wrapping
+  separator = SEPARATOR.match
+  peek()
+  while True:
+    try:
+      obj, position = scan(buffer, position)
+    except (json.JSONDecodeError, StopIteration) as error:
+      # assume the object continues in the next chunk, reading ever more
+      more = fp.read(max(chunk, len(buffer)))
+      if not more:
+        if isinstance(error, StopIteration):
+          raise json.JSONDecodeError("Expecting value", buffer, error.value) from None
+        raise
+      buffer, position = buffer[position:] + more, 0
+      continue
+    yield obj
+    match = separator(buffer, position)
+    if match and match.end() < len(buffer): # the next object starts right here
+      position = match.end()
+      continue
+    following = peek()
+    position += 1
+    if following == "]":
+      return
+    if following != ",":
+      raise json.JSONDecodeError("expected ',' or ']'", buffer, position - 1)
+    peek()
+
 def get_columns(obj):
   try:
     # should be a Record or a PlannedRecord, which exposes its columns
@@ -93,25 +273,85 @@ def get_columns(obj):
 
 def humanized(value):
   if isinstance(value, datetime):
-    return humanize.naturalday(value)
+    return naturalday(value)
   if isinstance(value, Decimal):
     return float(value)
   return value
 
-def asrow(obj):
+@cache
+def row_getter(cls):
+  """
+  returns a function that extracts the values of the columns from instances of
+  a (data)class, built only once per class, or None if cls has no columns
+  """
+  if not hasattr(cls, "columns") and not is_dataclass(cls):
+    return None
+  columns = get_columns(cls)
+  if len(columns) == 1:
+    getter = attrgetter(columns[0])
+    return lambda obj: ( getter(obj), )
+  return attrgetter(*columns)
+
+def rawrow(obj):
+  """
+  returns the values of the columns of an object (or dict) as a list
+  """
   if isinstance(obj, dict):
-    d = obj.copy()
-  else:
-    # should be a dataclass then
-    try:
-      d = asdict(obj)
-    except TypeError:
-      logger.warning(f"don't know how to make a dict of {obj}")
-      d = None
-  if d:
-    return [ humanized(d[key]) for key in get_columns(obj) ]
+    return [ obj[key] for key in get_columns(obj) ] if obj else None
+  getter = row_getter(type(obj))
+  if getter is None:
+    logger.warning(f"don't know how to make a row of {obj}")
+    return None
+  return list(getter(obj))
+
+def rawrows(objs):
+  """
+  turns objects into rows, like rawrow, only looking up the getter when the
+  class of the objects changes
+  """
+  cls    = None
+  getter = None
+  for obj in objs:
+    if type(obj) is not cls:
+      cls    = type(obj)
+      getter = None if isinstance(obj, dict) else row_getter(cls)
+    yield list(getter(obj)) if getter else rawrow(obj)
+
+def asrow(obj):
+  row = rawrow(obj)
+  if row:
+    return [ humanized(value) for value in row ]
   return None
 
+def asrows(objs):
+  for row in rawrows(objs):
+    yield [ humanized(value) for value in row ] if row else None
+
+def slotted(*extra):
+  """
+  recreates a dataclass with __slots__ for its fields, and the extra attributes,
+  like dataclass(slots=True) does on Python 3.10+. fields that are implemented
+  by a descriptor don't get a slot, the descriptor provides its own storage.
+  """
+  def decorator(cls):
+    inherited = {
+      name for base in cls.__mro__[1:] for name in getattr(base, "__slots__", ())
+    }
+    names = [
+      fld.name for fld in fields(cls)
+      if not hasattr(cls.__dict__.get(fld.name), "__set__")
+    ] + list(extra)
+    attributes = dict(cls.__dict__)
+    attributes["__slots__"] = tuple(
+      name for name in names if name not in inherited
+    )
+    for name in attributes["__slots__"]:
+      attributes.pop(name, None)
+    attributes.pop("__dict__", None)
+    attributes.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, attributes)
+  return decorator
+
 def all_subclasses(cls):
   return set(cls.__subclasses__()).union(
     [ s for c in cls.__subclasses__() for s in all_subclasses(c) ]
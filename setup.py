@@ -34,6 +34,10 @@ INSTALL_REQUIRES = [
   "python-slugify",
   
 ]
+EXTRAS_REQUIRE = {
+  "columnar" : [ "numpy" ],
+  
+}
 ENTRY_POINTS = {
   "console_scripts" : [
     "fintrack=fintrack.__main__:cli",
@@ -71,6 +75,7 @@ if __name__ == "__main__":
     url=URL,
     classifiers=CLASSIFIERS,
     install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
     entry_points=ENTRY_POINTS,
     scripts=SCRIPTS,
     include_package_data=True    
@@ -0,0 +1,16 @@
+from benchmarks.suite import Suite, BENCHMARKS
+from benchmarks       import generators
+
+def test_generated_records_are_ordered():
+  records = list(generators.records(100))
+  assert records == sorted(records)
+  assert len({ record.uid for record in records }) == 100
+
+def test_benchmarks_run_on_a_small_book():
+  suite = Suite(size=50, plans=3)
+  try:
+    results = suite.run(repeat=1)
+  finally:
+    suite.cleanup()
+  assert list(results) == list(BENCHMARKS)
+  assert all(seconds > 0 for seconds in results.values())
@@ -1,10 +1,302 @@
-from fintrack.books   import Sheet, SheetExtract, CombinedSheet, PlannedSheet
+import os
+import sys
+import subprocess
+
+import yaml
+import pytest
+
+from decimal import Decimal
+
+import fintrack.books
+from fintrack.books   import Book, Sheet, SheetExtract, CombinedSheet, PlannedSheet
+from fintrack.books   import DynamicSheet
 from fintrack.records import Record
+from fintrack.plans   import PlannedRecord
 from fintrack.utils   import asrow
 
 # Book
 
-# TODO
+def test_journaled_adds_only_append_to_journal(tmp_path):
+  book = Book(tmp_path)
+  book.add(-125, "test 1", timestamp="6/6")
+  book.add(-125, "test 2", timestamp="7/6")
+
+  assert not (tmp_path / "records.json").exists()
+  with (tmp_path / "records.journal").open() as fp:
+    assert len(fp.readlines()) == 2
+
+  assert [ record.description for record in Book(tmp_path) ] == [
+    "test 1",
+    "test 2"
+  ]
+
+def test_journal_is_replayed_on_top_of_snapshot(tmp_path):
+  book = Book(tmp_path)
+  book.add(-125, "test 1", timestamp="6/6")
+  book.save()
+  assert not (tmp_path / "records.journal").exists()
+  book.add(-125, "test 2", timestamp="7/6")
+  with (tmp_path / "records.journal").open("a") as fp:
+    fp.write('{ "amount": "-125", "descrip')  # a torn, partial write
+
+  assert [ record.description for record in Book(tmp_path) ] == [
+    "test 1",
+    "test 2"
+  ]
+
+def test_journal_is_compacted_beyond_limit(tmp_path):
+  book = Book(tmp_path, journal_limit=500)
+  for index in range(5):
+    book.add(-125, f"test {index}")
+  
+  assert (tmp_path / "records.json").exists()
+  assert len(Book(tmp_path)) == 5
+
+def test_unjournaled_adds_save_the_book(tmp_path):
+  book = Book(tmp_path, journal=False)
+  book.add(-125, "test 1")
+
+  assert not (tmp_path / "records.journal").exists()
+  assert (tmp_path / "records.json").exists()
+
+def inodes(folder):
+  return {
+    path.name : path.stat().st_ino
+    for path in folder.iterdir() if not path.name.startswith(".") # e.g. .lock
+  }
+
+def test_only_changed_sheets_are_saved(tmp_path):
+  book = Book(tmp_path, journal=False)
+  book.add(-125, "test 1")
+  book._sheets["plans"].add(-125, "groceries", "every friday")
+  book.save()
+  before = inodes(tmp_path)
+  assert set(before) == { "config.yaml", "records.json", "plans.json" }
+
+  book.add(-125, "test 2")
+  after = inodes(tmp_path)
+  assert after["records.json"] != before["records.json"]
+  assert after["plans.json"]   == before["plans.json"]
+  assert after["config.yaml"]  == before["config.yaml"]
+
+  book.save()
+  assert inodes(tmp_path) == after
+
+def test_journaled_adds_only_write_the_config_once(tmp_path):
+  book = Book(tmp_path)
+  book.add(-125, "test 1")
+  before = inodes(tmp_path)
+  book.add(-125, "test 2")
+  assert inodes(tmp_path)["config.yaml"] == before["config.yaml"]
+
+def test_replayed_journals_are_folded_on_save(tmp_path):
+  Book(tmp_path).add(-125, "test 1")
+  book = Book(tmp_path)
+  assert book.dirty == []
+  len(book)
+  assert book.dirty == [ "records" ]
+  book.save()
+  assert book.dirty == []
+  assert not (tmp_path / "records.journal").exists()
+  assert len(Book(tmp_path)) == 1
+
+def test_failed_saves_leave_previous_snapshot_intact(tmp_path, monkeypatch):
+  book = Book(tmp_path, journal=False)
+  book.add(-125, "test 1")
+  snapshot = (tmp_path / "records.json").read_text()
+
+  def torn(obj, fp, **kwargs):
+    fp.write('[ { "amount": "-125", "descrip')
+    raise OSError("disk full")
+  monkeypatch.setattr(fintrack.books.json, "dump", torn)
+  with pytest.raises(OSError):
+    book.add(-125, "test 2")
+
+  assert (tmp_path / "records.json").read_text() == snapshot
+  assert set(inodes(tmp_path)) == { "config.yaml", "records.json" }
+  assert not list(tmp_path.glob(".*.tmp"))
+  assert book.dirty == [ "records" ]
+
+def test_new_files_are_created_according_to_the_umask(tmp_path):
+  previous = os.umask(0o022)
+  try:
+    book = Book(tmp_path, journal=False)
+    book.add(-125, "test 1")
+    (tmp_path / "records.json").chmod(0o640)
+    book.add(-125, "test 2")
+  finally:
+    os.umask(previous)
+  assert (tmp_path / "config.yaml").stat().st_mode & 0o777 == 0o644
+  assert (tmp_path / "records.json").stat().st_mode & 0o777 == 0o640
+
+def test_saving_merges_records_of_other_writers(tmp_path):
+  one = Book(tmp_path, journal=False)
+  two = Book(tmp_path, journal=False)
+  one.add(-125, "test 1", timestamp="6/6")
+  two.add(-125, "test 2", timestamp="7/6")
+  one.add(-125, "test 3", timestamp="8/6")
+  assert [ record.description for record in Book(tmp_path) ] == [
+    "test 1", "test 2", "test 3"
+  ]
+
+def test_journals_of_other_writers_are_not_lost(tmp_path):
+  one = Book(tmp_path)
+  two = Book(tmp_path)
+  one.add(-125, "test 1", timestamp="6/6")
+  len(two)
+  two.add(-125, "test 2", timestamp="7/6")
+  one.add(-125, "test 3", timestamp="8/6")
+  one.save() # folds the journal, including the entry of two
+  two.add(-125, "test 4", timestamp="9/6")
+  two.save()
+  assert [ record.description for record in Book(tmp_path) ] == [
+    "test 1", "test 2", "test 3", "test 4"
+  ]
+  assert len(one) == 3 # one only merges on its next write
+
+def test_readers_dont_wait_for_writers(tmp_path):
+  writer = Book(tmp_path)
+  writer.add(-125, "test 1")
+  with writer.locked():
+    assert len(Book(tmp_path)) == 1
+
+ADDER = """
+import sys
+from fintrack.books import Book
+book = Book(sys.argv[1], journal_limit=2000)
+for index in range(25):
+  book.add(-125, f"{sys.argv[2]} {index}")
+  if index % 10 == 0:
+    book.save()
+"""
+
+def test_concurrent_processes_dont_lose_records(tmp_path):
+  env = os.environ | { "LOG_LEVEL" : "ERROR" }
+  processes = [
+    subprocess.Popen([ sys.executable, "-c", ADDER, str(tmp_path), f"p{index}" ], env=env)
+    for index in range(4)
+  ]
+  assert all(process.wait() == 0 for process in processes)
+  assert len(Book(tmp_path)) == 100
+
+def test_removals_are_journaled_and_not_resurrected(tmp_path):
+  one = Book(tmp_path)
+  one.add(-125, "test 1", timestamp="6/6", uid="1")
+  one.add(-125, "test 2", timestamp="7/6", uid="2")
+  one.save()
+  two = Book(tmp_path, journal=False)
+  len(two)
+  one.remove("1")
+  one.replace("2", -250, "test 2 corrected", timestamp="7/6")
+  assert "removed" in (tmp_path / "records.journal").read_text()
+  assert [ record.description for record in Book(tmp_path) ] == [ "test 2 corrected" ]
+
+  two.add(-125, "test 3", timestamp="8/6", uid="3") # merges the removals
+  two.remove("3")
+  one.save()                                        # rereads the old snapshot
+  one.add(-125, "test 4", timestamp="9/6", uid="4")
+  assert [ record.uid for record in one ] == [ "2", "4" ]
+  assert [ record.uid for record in Book(tmp_path) ] == [ "2", "4" ]
+  with pytest.raises(KeyError):
+    one.remove("3")
+
+def test_removals_of_other_writers_survive_their_compaction(tmp_path):
+  for journal in [ True, False ]:
+    folder = tmp_path / str(journal)
+    book   = Book(folder, journal=journal)
+    for uid in "123":
+      book.add(-125, f"test {uid}", timestamp=f"{uid}/6/2025", uid=uid)
+    book.save()
+    one = Book(folder, journal=journal)
+    two = Book(folder, journal=journal)
+    len(one), len(two)
+    two.remove("2")
+    two.replace("3", -250, "test 3 corrected", timestamp="3/6/2025")
+    two.save()
+    one.add(-125, "test 4", timestamp="4/6/2025", uid="4")
+    one.save()
+    assert [ record.uid for record in one ] == [ "1", "3", "4" ]
+    assert [ asrow(record)[1:4] for record in Book(folder) ] == [
+      [ -125, "test 1", "1" ], [ -250, "test 3 corrected", "3" ], [ -125, "test 4", "4" ]
+    ]
+
+def test_adding_known_uids(tmp_path):
+  book = Book(tmp_path)
+  book.add(-125, "test 1", timestamp="6/6", uid="1")
+  assert book.add(-250, "test 1", timestamp="6/6", uid="1", existing="skip").amount == -125
+  book.add(-250, "test 1", timestamp="6/6", uid="1", existing="update")
+  assert [ record.amount for record in Book(tmp_path) ] == [ -250 ]
+  book.add(-250, "test 1", timestamp="6/6", uid="1")
+  assert len(book) == 2
+  with pytest.raises(ValueError):
+    book.add(-125, "test 2", existing="replace")
+
+def test_slurping_overlapping_imports(tmp_path):
+  first  = [ "-125\tcoffee\t6/6/2025", "-125\tcoffee\t6/6/2025", "-50\tlunch\t7/6/2025" ]
+  second = [ "-125\tcoffee\t6/6/2025", "-125\tcoffee\t6/6/2025",
+             "-50\tlunch\t7/6/2025", "-75\tdinner\t8/6/2025" ]
+  book = Book(tmp_path)
+  assert book.slurp(first, existing="skip")["imported"] == 3
+  stats = book.slurp(second, existing="skip")
+  assert stats["imported"] == 1 and stats["skipped"] == 3
+  assert book.slurp(second, existing="update")["skipped"] == 4 # all the same
+  stats = book.slurp([ "-60\tlunch\t7/6/2025\t" + book[2].uid ], existing="update")
+  assert stats["imported"] == 0 and stats["updated"] == 1
+  assert [ asrow(record)[1:3] for record in Book(tmp_path) ] == [
+    [ -125, "coffee" ], [ -125, "coffee" ], [ -60, "lunch" ], [ -75, "dinner" ]
+  ]
+
+def test_scanning_stops_reading_after_the_window(tmp_path):
+  book = Book(tmp_path, journal=False)
+  for day in range(1, 11):
+    book.add(-day, f"test {day}", timestamp=f"{day}/6/2025", uid=str(day))
+  book = Book(tmp_path)
+  book.add(-11, "test 11", timestamp="3/6/2025", uid="11")
+  book.remove("2")
+  snapshot = (tmp_path / "records.json").read_text()
+  (tmp_path / "records.json").write_text(snapshot[:len(snapshot) * 2 // 3])
+
+  book = Book(tmp_path)
+  assert [ record.uid for record in book.scan(until="4/6/2025") ] == [ "1", "3", "11", "4" ]
+  assert [ record.uid for record in book.scan(start="3/6/2025", until="3/6/2025") ] == \
+         [ "3", "11" ]
+  with pytest.raises(ValueError): # loading reads the whole, now truncated, sheet
+    len(book)
+
+def test_sheets_are_loaded_on_first_access(tmp_path):
+  with (tmp_path / "config.yaml").open("w") as fp:
+    yaml.safe_dump({ "sheets" : { "records" : "Sheet", "archive" : "Sheet" } }, fp)
+  with (tmp_path / "archive.json").open("w") as fp:
+    fp.write("not json at all")
+
+  book = Book(tmp_path)
+  assert dict(book._sheets) == {}
+  book.add(-125, "test 1")
+  book.save()
+  assert list(book._sheets.keys()) == [ "records" ]
+  assert book.config["sheets"]["archive"] == "Sheet"
+  with (tmp_path / "archive.json").open() as fp:
+    assert fp.read() == "not json at all"
+
+def test_slurp_skips_blank_and_bad_rows(tmp_path):
+  source = [
+    "-125\ttest 1\t6/6",
+    "",
+    "abc\ttest 2\t7/6",
+    "-125\ttest 3\tnot a date at all",
+    "-125\ttest 4\t8/6",
+    "-125"
+  ]
+  book  = Book(tmp_path)
+  stats = book.slurp(source, batch=2)
+
+  assert stats["imported"] == 2
+  assert stats["bad"] == 3
+  assert [ record.description for record in book ] == [ "test 1", "test 4" ]
+  assert [ record.description for record in Book(tmp_path) ] == [
+    "test 1",
+    "test 4"
+  ]
 
 # Sheet
 
@@ -64,6 +356,22 @@ def test_taking_from_sheet():
     "test 4"
   ]
 
+def test_taking_from_sheet_bisects_window():
+  sheet = Sheet()
+  sheet.add(-125, "test 1", timestamp="6/6")
+  sheet.add(-125, "test 2", timestamp="7/6 12:00")
+  sheet.add(-125, "test 3", timestamp="8/6")
+  sheet.add(-125, "test 4", timestamp="9/6")
+  assert sheet.span() == (0, 4)
+  assert sheet.span(start="7/6", until="8/6") == (1, 3)
+  assert sheet.span(start="7/6 13:00", until="8/6") == (2, 3)
+  assert sheet.span(start="10/6") == (4, 4)
+  assert sheet.span(start="9/6", until="7/6") == (3, 3)
+  assert [ record.description for record in sheet.balanced.take(start="8/6") ] == [
+    "test 3",
+    "test 4"
+  ]
+
 def test_sheet_extracts():
   sheet = Sheet()
   sheet.add(-125, "test 1", timestamp="6/6")
@@ -116,6 +424,21 @@ def test_combined_sheets():
     "sheet 2 test 2"
   ]
 
+def test_cached_combined_sheets():
+  sheet1 = Sheet()
+  sheet1.add(-125, "sheet 1 test 1", timestamp="6/6")
+  sheet2 = Sheet()
+  sheet2.add(-125, "sheet 2 test 1", timestamp="5/6")
+
+  combined = CombinedSheet([ sheet1, sheet2 ], cached=True)
+  assert [ record.description for record in combined ] == [
+    "sheet 2 test 1",
+    "sheet 1 test 1"
+  ]
+  sheet1.add(-125, "sheet 1 test 2", timestamp="7/6")
+  assert len(combined) == 2
+  assert len(combined.refresh()) == 3
+
 def test_planned_sheet_taking():
   sheet = PlannedSheet()
   sheet.add(
@@ -141,3 +464,137 @@ def test_planned_sheet_taking():
     ["Jan 17", -125, "groceries", "groceries on Jan 17"],
     ["Jan 19",    5, "savings",   "savings on Jan 19"  ]
   ]
+
+def test_planned_sheet_taking_stops_generating_early(monkeypatch):
+  sheet = PlannedSheet()
+  sheet.add(-125, "groceries", "every week on friday")
+  sheet.add(5, "savings", "every day")
+  generated = []
+  monkeypatch.setattr(
+    PlannedRecord, "occurrence",
+    lambda plan, on_date, index: generated.append(on_date) or \
+                                 Record(plan.amount, plan.description, on_date)
+  )
+  records = list(sheet.take(3, start="6/1/2025", until="6/1/2035"))
+  assert len(records) == 3
+  assert len(generated) < 10
+
+def test_occurrences_of_plans_are_persisted(tmp_path, monkeypatch):
+  book = Book(tmp_path)
+  book.sheet = "plans"
+  book.add(-125, "groceries", "every week on friday", "groceries on {date}")
+  book.add(5, "savings", "every day")
+  expected = [ asrow(record) for record in book.sheet.take(until="1/7/2025", start="1/6/2025") ]
+  assert (tmp_path / ".plans.cache.json").exists()
+
+  plans = Book(tmp_path)._sheets["plans"]
+  monkeypatch.setattr(PlannedRecord, "occurrence", lambda *args: pytest.fail("expanded"))
+  assert [ asrow(record) for record in plans.take(until="1/7/2025", start="1/6/2025") ] == expected
+  plans[0].amount = -150
+  with pytest.raises(pytest.fail.Exception):
+    list(plans.take(until="1/7/2025", start="1/6/2025"))
+
+def parallel_plans(workers):
+  sheet = PlannedSheet(workers=workers)
+  sheet.add(-125, "groceries", "every week on friday", "groceries on {date}")
+  sheet.add(5, "savings", "every other day", "savings {index}")
+  sheet.add(-50, "insurance", "every month on the 1st", "insurance {index}")
+  sheet.add(-500, "rent", "7/1/2025")
+  return sheet
+
+def test_plans_can_be_expanded_in_parallel(monkeypatch):
+  monkeypatch.setattr(fintrack.books, "PARALLEL_PLANS", 2)
+  window   = { "until" : "1/6/2025", "start" : "1/1/2025" }
+  serial   = [ asrow(record) for record in parallel_plans(0).take(**window) ]
+  parallel = parallel_plans(2)
+  assert [ asrow(record) for record in parallel.take(**window) ] == serial
+  assert all(entry[1] for entry in parallel.cache._entries.values())
+  monkeypatch.setattr(PlannedRecord, "occurrence", lambda *args: pytest.fail("expanded"))
+  assert [ asrow(record) for record in parallel.take(**window) ] == serial
+  monkeypatch.undo()
+  monkeypatch.setattr(fintrack.books, "PARALLEL_PLANS", 2)
+  pool = parallel.cache.pool(2) # the pool is reused to extend the expansion
+  assert len(list(parallel.take(until="1/7/2025", start="1/1/2025"))) > len(serial)
+  assert parallel.cache.pool(2) is pool
+  parallel.cache.close()
+
+def test_few_plans_are_expanded_serially(monkeypatch):
+  import concurrent.futures
+  monkeypatch.setattr(
+    concurrent.futures, "ProcessPoolExecutor", lambda *args: pytest.fail("pooled")
+  )
+  assert len(list(parallel_plans(2).take(until="1/2/2025", start="1/1/2025"))) > 10
+
+def test_balance_index():
+  sheet = Sheet()
+  sheet.add(100, "test 1", timestamp="6/6")
+  sheet.add(-25, "test 2", timestamp="8/6")
+  sheet.add(-25, "test 3", timestamp="9/6")
+  assert sheet.balanced.balance_at("7/6") == 100
+  assert sheet.balanced.balance_at("9/6") == 50
+  assert sheet.balanced.balance_between(start="8/6", until="9/6") == -50
+
+  sheet.add("0,10", "test 4", timestamp="7/6")
+  assert sheet.balanced.balance_at("7/6") == Decimal("100.10")
+  assert sheet.balanced.balance_at("10/6") == Decimal("50.10")
+  assert [ row[:3] for row in sheet.balanced.window(start="8/6") ] == [
+    [ "Jun 08", -25, 75.10 ],
+    [ "Jun 09", -25, 50.10 ]
+  ]
+
+def test_records_by_uid():
+  sheet = Sheet()
+  sheet.add(100, "test 1", timestamp="6/6", uid="1")
+  sheet.add(-25, "test 2", timestamp="7/6", uid="2")
+  sheet.add(-25, "test 3", timestamp="7/6", uid="3")
+  sheet.add(-25, "test 4", timestamp="8/6")
+  assert sheet.get("3").description == "test 3"
+  assert sheet.get(sheet[-1].uid) is sheet[-1]
+  assert sheet.get("5") is None
+  assert sheet.balanced.balance_at("8/6") == 25
+
+  version = sheet.version
+  assert sheet.remove("3").description == "test 3"
+  assert sheet.version > version
+  assert sheet.get("3") is None
+  assert [ record.uid for record in sheet ][:2] == [ "1", "2" ]
+  assert sheet.balanced.balance_at("8/6") == 50
+  with pytest.raises(KeyError):
+    sheet.remove("3")
+
+  sheet.replace("2", -50, "test 2 corrected", timestamp="9/6")
+  assert sheet.get("2").description == "test 2 corrected"
+  assert sheet[-1].uid == "2"
+  assert sheet.balanced.balance_at("8/6") == 75
+  assert len(sheet) == 3
+
+def test_balance_index_after_inserting_before_the_last_record(tmp_path):
+  sheet = Sheet()
+  sheet.add(1, "test 1", timestamp="1/1")
+  sheet.add(2, "test 2", timestamp="2/1")
+  sheet.add(4, "test 4", timestamp="4/1")
+  assert sheet.balanced.balance_at("4/1") == 7
+  sheet.update([ Record(100, "test 3", timestamp="3/1") ])
+  assert sheet.balanced.balance_at("3/1") == 103
+  assert sheet.balanced.balance_at("4/1") == 107
+
+  book = Book(tmp_path)
+  book.add(100, "test 1", timestamp="1/6/2025")
+  book.add(100, "test 3", timestamp="3/6/2025")
+  book.save()
+  book.add(5, "test 2", timestamp="2/6/2025") # journaled, replayed on reload
+  book = Book(tmp_path)
+  assert book.sheet.balanced.balance_at("2/6/2025") == 105
+  assert book.sheet.balanced.balance_at("3/6/2025") == 205
+
+def test_balanced_dynamic_sheets_are_scanned():
+  sheet = Sheet()
+  sheet.add(100, "test 1", timestamp="6/6")
+  sheet.add(-25, "test 2", timestamp="8/6")
+  sheet.add(-25, "test 3", timestamp="9/6")
+  balanced = DynamicSheet().include(sheet).balanced
+  assert balanced.balance_at("8/6") == 75
+  assert [ row[:3] for row in balanced.window(count=1, start="8/6") ] == [
+    [ "Jun 08", -25, 75 ]
+  ]
+  assert [ row[2] for row in balanced.slice_rows(1) ] == [ 75, 50 ]
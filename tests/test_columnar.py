@@ -0,0 +1,89 @@
+import pytest
+
+import json
+import yaml
+
+from io import BytesIO
+
+from fintrack.books   import Book, Sheet, PlannedSheet
+
+from fintrack import columnar
+
+np = pytest.importorskip("numpy")
+
+def test_columnar_round_trip():
+  sheet = Sheet()
+  sheet.add("600,21",  "start", timestamp="1/5/2025 10:20:30", uid="uid1")
+  sheet.add("-14,60",  "test",  timestamp="11/5/2025",         uid="uid2")
+  sheet.add(-32,       "test",  timestamp="12/5/2025",         uid="uid3")
+
+  columns = columnar.columns(sheet)
+  assert columns["amount"].dtype == np.int64
+  assert columns["timestamp"].dtype == np.int64
+  assert columns["descriptions"].tolist() == [ "start", "test" ]
+
+  fp = BytesIO()
+  columnar.save(sheet, fp)
+  fp.seek(0)
+  records = columnar.load(fp)
+
+  assert records == list(sheet)
+  assert [ str(record.amount) for record in records ] == [ "600.21", "-14.6", "-32" ]
+
+def test_columnar_amounts_keep_all_their_decimals(tmp_path):
+  sheet = Sheet()
+  sheet.add("1,123456",   "six",    timestamp="1/5/2025", uid="uid1")
+  sheet.add("2,50000000", "zeros",  timestamp="2/5/2025", uid="uid2")
+  fp = BytesIO()
+  columnar.save(sheet, fp)
+  fp.seek(0)
+  assert [ str(record.amount) for record in columnar.load(fp) ] == [ "1.123456", "2.5" ]
+
+  sheet.add("1,1234567", "seven", timestamp="3/5/2025", uid="uid3")
+  with pytest.raises(ValueError):
+    columnar.save(sheet, BytesIO())
+
+  book = Book(tmp_path)
+  book.add("1,1234567", "seven", timestamp="3/5/2025", uid="uid3")
+  book.save()
+  with pytest.raises(ValueError):
+    book.convert("records", "columnar")
+  assert "formats" not in book.config
+  assert not (tmp_path / "records.npz").exists()
+  with (tmp_path / "records.json").open() as fp:
+    assert json.load(fp)[0]["amount"] == "1.1234567"
+
+def test_columnar_only_supports_records():
+  sheet = PlannedSheet()
+  sheet.add(-125, "groceries", "every friday")
+  with pytest.raises(TypeError):
+    columnar.save(sheet, BytesIO())
+
+def test_converting_book_sheets(tmp_path):
+  book = Book(tmp_path)
+  book.add(-125, "test 1", timestamp="6/6", uid="uid1")
+  book.add(+125, "test 2", timestamp="7/6", uid="uid2")
+  book.save()
+
+  book.convert("records", "columnar")
+  assert (tmp_path / "records.npz").exists()
+  assert not (tmp_path / "records.json").exists()
+  with (tmp_path / "config.yaml").open() as fp:
+    assert yaml.safe_load(fp)["formats"] == { "records" : "columnar" }
+
+  reloaded = Book(tmp_path)
+  assert list(reloaded) == list(book)
+  reloaded.add(-250, "test 3", timestamp="8/6", uid="uid3")
+  reloaded.save()
+
+  Book(tmp_path).convert("records", "json")
+  assert not (tmp_path / "records.npz").exists()
+  with (tmp_path / "records.json").open() as fp:
+    assert len(json.load(fp)) == 3
+  assert "formats" not in Book(tmp_path).config
+
+def test_converting_plans_is_refused(tmp_path):
+  book = Book(tmp_path)
+  with pytest.raises(TypeError):
+    book.convert("plans", "columnar")
+  assert "formats" not in book.config
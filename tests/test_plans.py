@@ -1,8 +1,11 @@
-from datetime import datetime
+from freezegun import freeze_time
+from datetime import datetime, timedelta
 
-from fintrack.plans import PlannedRecord
+from fintrack.plans import PlannedRecord, Occurrences
 from fintrack.utils import asrow
 
+import fintrack.plans
+
 def test_fixed_timestamp_plan():
   plan = PlannedRecord(
     -125,
@@ -16,3 +19,111 @@ def test_fixed_timestamp_plan():
     ["Jan 24", -125, "groceries", "groceries on Jan 24"],
     ["Feb 07", -125, "groceries", "groceries on Feb 07"]
   ]
+
+def test_schedules_are_compiled_once(monkeypatch):
+  plans = [
+    PlannedRecord(-125, "groceries", "every week on friday"),
+    PlannedRecord(5, "savings", "every other day"),
+    PlannedRecord(-50, "insurance", "every month on the 1st")
+  ]
+  def fail(*args, **kwargs):
+    assert False, "schedules should not be parsed again"
+  monkeypatch.setattr(fintrack.plans, "RecurringEvent", fail)
+
+  ordered = [ plan.description for plan in sorted(plans) ]
+  plans.reverse()
+  assert [ plan.description for plan in sorted(plans) ] == ordered
+  assert len(plans[-1].take(3, start=datetime(2025, 1, 6))) == 3
+
+def test_next_occurrence_is_cached_per_day():
+  plan = PlannedRecord(5, "savings", "every day")
+  with freeze_time("Jan 14th, 2012 10:00"):
+    assert plan.next_occurrence is plan.next_occurrence
+    assert plan.timestamp == datetime(2012, 1, 15)
+  with freeze_time("Jan 20th, 2012 10:00"):
+    assert plan.timestamp == datetime(2012, 1, 21)
+
+def test_intra_day_occurrences_start_from_now():
+  early = PlannedRecord(5, "savings", "every day at 3am")
+  hourly = PlannedRecord(5, "savings", "every hour")
+  with freeze_time("Jan 14th, 2012 06:00"):
+    assert early.timestamp == datetime(2012, 1, 15, 3)
+    assert [ record.timestamp for record in early.take(until=datetime(2012, 1, 16)) ] == [
+      datetime(2012, 1, 15, 3)
+    ]
+  with freeze_time("Jan 14th, 2012 10:30") as frozen:
+    assert hourly.timestamp == datetime(2012, 1, 14, 11)
+    assert [ record.timestamp for record in hourly.take(2) ] == [
+      datetime(2012, 1, 14, 11), datetime(2012, 1, 14, 12)
+    ]
+    cached = Occurrences().occurrences(hourly, until=datetime(2012, 1, 14, 13))
+    assert [ record.timestamp for record in cached ] == [
+      datetime(2012, 1, 14, 11), datetime(2012, 1, 14, 12)
+    ]
+    frozen.tick(timedelta(hours=1))
+    assert hourly.timestamp == datetime(2012, 1, 14, 12)
+
+def test_changed_schedules_are_recompiled():
+  plan = PlannedRecord(5, "savings", "every day")
+  plan.schedule = "every week on friday"
+  dates = [ record.timestamp for record in plan.take(2, start=datetime(2025, 1, 6)) ]
+  assert dates == [ datetime(2025, 1, 10), datetime(2025, 1, 17) ]
+
+def test_past_single_plans_sort_last():
+  plan = PlannedRecord(5, "savings", "jan 1st 2012")
+  assert plan.next_occurrence is None
+  assert plan.timestamp == datetime.max
+
+def test_occurrences_are_generated_lazily():
+  plan = PlannedRecord(5, "savings", "every day")
+  occurrences = plan.occurrences(start=datetime(2025, 1, 6))
+  assert next(occurrences).timestamp == datetime(2025, 1, 7)
+  assert next(occurrences).timestamp == datetime(2025, 1, 8)
+
+def test_taking_requires_a_bound_for_recurring_plans():
+  try:
+    PlannedRecord(5, "savings", "every day").take()
+    assert False, "expected taking without count or until to fail"
+  except ValueError:
+    pass
+
+def test_plans_are_slotted():
+  plan = PlannedRecord(-125, "groceries", "every month", uid="1")
+  assert not hasattr(plan, "__dict__")
+  assert plan.uid == "1"
+  plan.schedule = "every week"
+  assert plan.event[1] # still recompiles
+
+def test_occurrences_are_cached_and_extended(monkeypatch):
+  cache = Occurrences()
+  plan  = PlannedRecord(5, "savings", "every day", "{plan.description} on {date}")
+  start = datetime(2025, 1, 6)
+  first = list(cache.occurrences(plan, until=datetime(2025, 1, 10), start=start))
+  assert [ record.timestamp.day for record in first ] == [ 7, 8, 9 ]
+
+  expanded = []
+  original = PlannedRecord.occurrence
+  monkeypatch.setattr(
+    PlannedRecord, "occurrence",
+    lambda plan, on_date, index: expanded.append(on_date) or original(plan, on_date, index)
+  )
+  assert list(cache.occurrences(plan, until=datetime(2025, 1, 10), start=start)) == first
+  assert expanded == []
+  longer = list(cache.occurrences(plan, until=datetime(2025, 1, 13), start=start))
+  assert longer[:3] == first
+  assert [ record.uid for record in longer ][3:] == [
+    "savings on Jan 10", "savings on Jan 11", "savings on Jan 12"
+  ]
+  assert [ dt.day for dt in expanded ] == [ 11, 12, 13 ] # 10 was already known
+
+  plan.amount = 10
+  assert next(iter(cache.occurrences(plan, until=datetime(2025, 1, 8), start=start))).amount == 10
+
+def test_occurrences_cache_only_holds_for_a_day():
+  plan = PlannedRecord(5, "savings", "every day", "{plan.description} on {date}")
+  with freeze_time("Jan 14th, 2012 10:00"):
+    cache = Occurrences()
+    assert next(cache.occurrences(plan)).uid == "savings on tomorrow"
+  with freeze_time("Jan 15th, 2012 10:00"):
+    assert next(cache.occurrences(plan, start=datetime(2012, 1, 14))).uid == \
+           "savings on today"
@@ -0,0 +1,75 @@
+import json
+
+from io import StringIO
+
+import pytest
+
+from fintrack           import profiling
+from fintrack.profiling import Profiler
+from fintrack.books     import Book
+
+@pytest.fixture
+def profiler():
+  profiling.profiler.reset()
+  profiling.profiler.enable()
+  yield profiling.profiler
+  profiling.profiler.disable()
+  profiling.profiler.output = None
+  profiling.profiler.reset()
+
+def test_disabled_profiler_records_nothing():
+  profiler = Profiler()
+  @profiler.timed("work")
+  def work():
+    return 42
+  with profiler.span("block"):
+    profiler.count("things")
+  assert work() == 42
+  assert profiler.spans == {}
+  assert profiler.counters == {}
+
+def test_spans_and_counters_are_recorded():
+  profiler = Profiler(enabled=True)
+  @profiler.timed("work")
+  def work():
+    return 42
+  for _ in range(3):
+    assert work() == 42
+  profiler.count("things", 5)
+  profiler.count("things")
+  assert profiler.spans["work"][0] == 3
+  assert profiler.counters == { "things" : 6 }
+  report = profiler.report()
+  assert "work" in report and "things" in report
+
+def test_profile_flag_is_stripped_from_arguments(profiler):
+  profiler.disable()
+  assert profiling.from_args([ "add", "10", "--profile" ]) == [ "add", "10" ]
+  assert profiler.enabled
+  assert profiling.from_args([ "--profile=out.jsonl", "show" ]) == [ "show" ]
+  assert profiler.output == "out.jsonl"
+
+def test_hot_paths_are_instrumented(profiler, tmp_path):
+  book = Book(tmp_path, journal=False)
+  book.add(-125, "groceries", "7/6/2019")
+  book.add(+500, "salary", "8/6/2019")
+  book.save()
+  assert len(Book(tmp_path).sheet) == 2
+  for span in [ "book.load", "book.load_sheet", "book.save", "book.compact",
+                "json.decode", "parse_amount", "parse_datetime", "sheet.insert" ]:
+    assert span in profiler.spans, span
+  assert profiler.counters["decoder.objects"] == 2
+
+def test_measurements_are_dumped_as_json_lines(profiler, tmp_path):
+  with profiler.span("work"):
+    profiler.count("things")
+  profiler.output = tmp_path / "profile.jsonl"
+  out = StringIO()
+  profiler.finish(out)
+  profiler.finish(out)
+  assert "work" in out.getvalue()
+  lines = (tmp_path / "profile.jsonl").read_text().splitlines()
+  assert len(lines) == 2
+  dump = json.loads(lines[0])
+  assert dump["spans"]["work"]["count"] == 1
+  assert dump["counters"] == { "things" : 1 }
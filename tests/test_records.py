@@ -1,7 +1,11 @@
 from freezegun import freeze_time
-from datetime import datetime
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 import json
+import uuid
+import pickle
+import tracemalloc
 
 from fintrack.records import Record
 from fintrack.utils   import ClassEncoder
@@ -45,3 +49,38 @@ def test_recordencoder():
     assert False, "expected encoder to fail on non-Record objecttype"
   except TypeError:
     pass
+
+def test_record_uids_are_kept_compact():
+  uid    = str(uuid.uuid4())
+  record = Record(-125, "test record", uid=uid)
+  assert record.uid == uid
+  assert isinstance(record._uid, bytes)
+  assert Record(-125, "test record", uid=uuid.UUID(uid)).uid == uid
+  assert Record(-125, "test record", uid=uid.upper()).uid == uid.upper()
+  assert Record(-125, "test record", uid=123).uid == 123
+
+def test_records_are_slotted_and_intern_descriptions():
+  r1 = Record(-125, "".join([ "test", " record" ])) # noqa: FLY002 not interned
+  r2 = Record(-125, "".join([ "test", " record" ])) # noqa: FLY002
+  assert not hasattr(r1, "__dict__")
+  assert r1.description is r2.description
+  assert pickle.loads(pickle.dumps(r1)) == r1
+
+# per record: the record, its Decimal amount, datetime and uid, and a list slot
+MAX_BYTES_PER_RECORD = 300
+
+def test_record_memory_footprint():
+  count = 10000
+  start = datetime(2020, 1, 1)
+  tracemalloc.start()
+  try:
+    before  = tracemalloc.get_traced_memory()[0]
+    records = [
+      Record(Decimal(index), f"description {index % 10}", start + timedelta(minutes=index))
+      for index in range(count)
+    ]
+    used = tracemalloc.get_traced_memory()[0] - before
+  finally:
+    tracemalloc.stop()
+  assert len(records) == count
+  assert used / count < MAX_BYTES_PER_RECORD
@@ -0,0 +1,58 @@
+import pytest
+
+from fintrack.books   import Sheet
+from fintrack.reports import Report
+
+pytest.importorskip("numpy")
+
+def sheet():
+  sheet = Sheet()
+  sheet.add("1000",   "salary",            timestamp="1/5/2025")
+  sheet.add("-50,50", "groceries shop A",  timestamp="2/5/2025")
+  sheet.add("-20",    "groceries shop B",  timestamp="4/5/2025")
+  sheet.add("-30",    "groceries shop A",  timestamp="6/5/2025")
+  sheet.add("1000",   "salary",            timestamp="1/6/2025")
+  sheet.add("-10",    "groceries shop B",  timestamp="3/6/2025")
+  return sheet
+
+def test_report_by_period():
+  assert list(sheet().report(by="month")) == [
+    [ "2025-05", 4, 899.5, -50.5, 1000.0, 224.875 ],
+    [ "2025-06", 2, 990.0, -10.0, 1000.0, 495.0 ]
+  ]
+  assert [ row[:3] for row in sheet().report(by="week") ] == [
+    [ "2025-04-28", 3, 929.5 ],
+    [ "2025-05-05", 1, -30.0 ],
+    [ "2025-05-26", 1, 1000.0 ],
+    [ "2025-06-02", 1, -10.0 ]
+  ]
+  assert [ row[:3] for row in sheet().report(by="year") ] == [
+    [ "2025", 6, 1889.5 ]
+  ]
+
+def test_report_by_pattern():
+  report = sheet().report(by=None, pattern=r"groceries (shop \w)")
+  assert report.columns == ( "match", "count", "sum", "min", "max", "average" )
+  assert list(report) == [
+    [ "shop A", 2, -80.5, -50.5, -30.0, -40.25 ],
+    [ "shop B", 2, -30.0, -20.0, -10.0, -15.0 ]
+  ]
+  report = sheet().report(by="month", pattern="groceries")
+  assert [ row[:4] for row in report ] == [
+    [ "2025-05", "groceries", 3, -100.5 ],
+    [ "2025-06", "groceries", 1, -10.0 ]
+  ]
+
+def test_report_on_empty_sheet():
+  assert list(Sheet().report()) == []
+  assert list(sheet().report(pattern="nothing matches this")) == []
+
+def test_report_validates_periods():
+  with pytest.raises(ValueError):
+    Report(sheet().arrays, by="fortnight")
+
+def test_sheet_arrays_are_cached():
+  records = sheet()
+  assert records.arrays is records.arrays
+  records.add(-10, "test", timestamp="4/6/2025")
+  assert len(records.arrays["amount"]) == 7
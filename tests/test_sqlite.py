@@ -0,0 +1,100 @@
+import yaml
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from fintrack.books   import Book
+from fintrack.sqlite  import SqliteSheet, SqlitePlannedSheet
+from fintrack.utils   import asrow
+
+def sqlite_book(folder, **kwargs):
+  with (folder / "config.yaml").open("w") as fp:
+    yaml.safe_dump({ "storage" : "sqlite" }, fp)
+  return Book(folder, **kwargs)
+
+def add_records(book):
+  book.add(-125, "test 1", timestamp="6/6/2025", uid="1")
+  book.add(+250, "test 3", timestamp="8/6/2025", uid="3")
+  book.add(+125, "test 2", timestamp="7/6/2025", uid="2")
+  book.add(-500, "test 4", timestamp="7/6/2025", uid="4")
+
+def test_sheets_are_stored_in_the_database(tmp_path):
+  book = sqlite_book(tmp_path)
+  add_records(book)
+  book._sheets["plans"].add(-125, "groceries", "every friday", uid="p1")
+  book.save()
+
+  assert isinstance(book.sheet, SqliteSheet)
+  assert (tmp_path / "book.sqlite").exists()
+  assert not list(tmp_path.glob("*.json")) + list(tmp_path.glob("*.journal"))
+  assert book.config["storage"] == "sqlite"
+
+  reloaded = Book(tmp_path)
+  assert [ record.uid for record in reloaded ] == [ "1", "2", "4", "3" ]
+  assert reloaded[0].amount == Decimal(-125)
+  assert reloaded[-1].timestamp == datetime(2025, 6, 8)
+  assert len(reloaded) == 4
+  plans = reloaded._sheets["plans"]
+  assert isinstance(plans, SqlitePlannedSheet)
+  assert [ plan.uid for plan in plans ] == [ "p1" ]
+
+def test_sqlite_sheets_behave_like_sheets(tmp_path):
+  book  = sqlite_book(tmp_path)
+  files = Book(tmp_path / "files")
+  add_records(book)
+  add_records(files)
+
+  for window in [
+    {}, { "count" : 2 }, { "start" : "7/6/2025" }, { "until" : "7/6/2025" },
+    { "start" : "7/6/2025", "until" : "7/6/2025", "count" : 1 }
+  ]:
+    assert list(book.sheet.take(**window)) == list(files.sheet.take(**window))
+  assert list(book.sheet.rows) == list(files.sheet.rows)
+  assert list(book.sheet.slice_rows(1, 3)) == list(files.sheet.slice_rows(1, 3))
+  assert list(book.sheet.balanced.rows) == list(files.sheet.balanced.rows)
+  assert book.sheet.balanced.balance_at(datetime(2025, 6, 7)) == Decimal(-500)
+  with pytest.raises(IndexError):
+    book.sheet[4]
+
+def test_slurping_into_sqlite(tmp_path):
+  book  = sqlite_book(tmp_path)
+  stats = book.slurp([ "-125\ttest 1\t6/6/2025\n", "bad\n", "+125\ttest 2\t7/6/2025\n" ])
+  assert stats["imported"] == 2 and stats["bad"] == 1
+  assert [ asrow(record)[2] for record in Book(tmp_path) ] == [ "test 1", "test 2" ]
+
+def test_sqlite_records_by_uid(tmp_path):
+  book = sqlite_book(tmp_path)
+  add_records(book)
+  assert book.sheet.get("2").description == "test 2"
+  book.remove("2")
+  book.replace("4", -400, "test 4 corrected", timestamp="9/6/2025")
+  book.add(-125, "test 1", timestamp="6/6/2025", uid="1", existing="skip")
+  reloaded = Book(tmp_path)
+  assert [ record.uid for record in reloaded ] == [ "1", "3", "4" ]
+  assert reloaded.sheet.get("4").amount == Decimal(-400)
+  assert reloaded.sheet.get("2") is None
+  with pytest.raises(KeyError):
+    reloaded.remove("2")
+
+def test_sqlite_removes_one_of_duplicate_uids(tmp_path):
+  book = sqlite_book(tmp_path)
+  book.add(-125, "test 1", timestamp="6/6/2025", uid="1")
+  book.add(-125, "test 1", timestamp="7/6/2025", uid="1")
+  book.add(-125, "test 1", timestamp="8/6/2025", uid="1")
+  book.replace("1", -100, "test 1 corrected", timestamp="9/6/2025")
+  assert [ asrow(record)[1:3] for record in Book(tmp_path) ] == [
+    [ -125, "test 1" ], [ -125, "test 1" ], [ -100, "test 1 corrected" ]
+  ]
+
+  book.sheet = "plans"
+  book.add(-50, "insurance", "every month on the 1st", uid="plan")
+  book.add(-10, "fee", "every month on the 1st", uid="plan")
+  book.remove("plan")
+  assert len(Book(tmp_path)._sheets["plans"]) == 1
+
+def test_sqlite_sheets_cant_be_converted(tmp_path):
+  book = sqlite_book(tmp_path)
+  with pytest.raises(ValueError):
+    book.convert("records", "columnar")
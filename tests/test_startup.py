@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import subprocess
+
+# generous, to avoid flakiness on slow machines, but well below eager imports
+STARTUP_BUDGET = float(os.environ.get("STARTUP_BUDGET", "0.75"))
+
+HEAVY = [
+  "fire", "dateparser", "recurrent", "dateutil.rrule", "humanize", "tabulate",
+  "yaml", "numpy"
+]
+
+def run(home, *args):
+  return subprocess.run(
+    [ sys.executable, *args ],
+    capture_output=True, text=True, check=True,
+    env=os.environ | { "HOME" : str(home), "LOG_LEVEL" : "ERROR" }
+  )
+
+def test_heavy_dependencies_are_not_imported_at_startup(tmp_path):
+  result = run(
+    tmp_path, "-c",
+    "import sys, fintrack.__main__; "
+    f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+  )
+  assert result.stdout.strip() == ""
+
+def test_adding_only_imports_what_it_needs(tmp_path):
+  result = run(
+    tmp_path, "-c",
+    "import sys; from fintrack.tracker import Tracker; "
+    "Tracker().add(-125, 'groceries'); "
+    f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+  )
+  assert result.stdout.strip() == "humanize,yaml" # logging the record & config
+
+def test_version_starts_within_budget(tmp_path):
+  timings = []
+  for _ in range(3):
+    start = time.perf_counter()
+    result = run(tmp_path, "-m", "fintrack", "version")
+    timings.append(time.perf_counter() - start)
+  assert result.stdout.strip() == "0.0.1"
+  assert min(timings) < STARTUP_BUDGET
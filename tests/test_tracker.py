@@ -1,3 +1,6 @@
+import pytest
+
+from freezegun import freeze_time
 from pathlib import Path
 
 import yaml
@@ -97,3 +100,53 @@ def test_slurp(tmp_path, monkeypatch):
     [ "May 11", -14.6,  "test 456", "456" ],
     [ "May 12", -32.34, "test 123", "456" ]
   ]
+
+@freeze_time("Jun 11th, 2025 10:00")
+def test_future_and_overview(tmp_path):
+  tracker = Tracker(tmp_path)
+  tracker.add(125, "starting balance", timestamp="10/6/2025")
+  tracker.select("plans").add(-125, "groceries", "every friday", "groceries on {date}")
+  tracker.select("records")
+
+  assert [ asrow(record) for record in tracker.future(until="1/7/2025").current_sheet ] == [
+    [ "Jun 13", -125, "groceries", "groceries on Jun 13" ],
+    [ "Jun 20", -125, "groceries", "groceries on Jun 20" ],
+    [ "Jun 27", -125, "groceries", "groceries on Jun 27" ]
+  ]
+
+  overview = tracker.overview.balanced.current_sheet
+  tracker.add(-25, "payment", timestamp="11/6/2025 9:00")
+  assert [ row[:3] for row in overview.rows ][:4] == [
+    [ "yesterday",  125,  125 ],
+    [ "today",      -25,  100 ],
+    [ "Jun 13",    -125,  -25 ],
+    [ "Jun 20",    -125, -150 ]
+  ]
+
+def test_report(tmp_path):
+  tracker = Tracker(tmp_path)
+  tracker.add(-125, "test 1", timestamp="6/5/2025")
+  tracker.add(+125, "test 2", timestamp="7/6/2025")
+  tracker.add(-250, "test 3", timestamp="8/6/2025")
+  assert list(tracker.report(by="month").current_sheet.rows) == [
+    [ "2025-05", 1, -125.0, -125.0, -125.0, -125.0 ],
+    [ "2025-06", 2, -125.0, -250.0,  125.0,  -62.5 ]
+  ]
+
+def test_window(tmp_path):
+  tracker = Tracker(tmp_path)
+  for day in range(1, 6):
+    tracker.add(-day, f"test {day}", timestamp=f"{day}/6/2025")
+  tracker = Tracker(tmp_path)
+  rows = [ asrow(record)[:3] for record in tracker.window(start="2/6/2025", until="3/6/2025").current_sheet ]
+  assert rows == [ [ "Jun 02", -2, "test 2" ], [ "Jun 03", -3, "test 3" ] ]
+  assert len(tracker.balanced.window(until="2/6/2025").current_sheet) == 1
+
+  # balances of a window start from the balance of the records before it
+  tracker = Tracker(tmp_path)
+  rows = [ row[:3] for row in tracker.window(start="3/6/2025").balanced.current_sheet.rows ]
+  assert rows == [ [ "Jun 03", -3, -6 ], [ "Jun 04", -4, -10 ], [ "Jun 05", -5, -15 ] ]
+
+  # plans recur without end, so their window needs an until
+  with pytest.raises(ValueError):
+    Tracker(tmp_path).select("plans").window(start="3/6/2025")
@@ -8,6 +8,7 @@ from fintrack.ui.tabular import Tabular, positive_green, negative_red
 import fintrack.utils
 
 from unittest.mock import Mock
+from io import StringIO
 
 @freeze_time("Jan 14th, 2012", auto_tick_seconds=24*3600)
 def test_basic_sheet_usage(monkeypatch):
@@ -60,3 +61,55 @@ def test_sheet_coloring(monkeypatch):
 +-------------+----------+-----------+---------------+-------+
 | Jan 15      |     {Fore.RED}-100{Style.RESET_ALL} |       {Fore.RED}-50{Style.RESET_ALL} | test 2        | uid2  |
 +-------------+----------+-----------+---------------+-------+"""
+
+@freeze_time("Jan 14th, 2012", auto_tick_seconds=24*3600)
+def test_streamed_tables_look_the_same(monkeypatch):
+  monkeypatch.setattr(fintrack.utils.uuid, "uuid4", Mock(side_effect=["1", "2", "3"]))
+
+  sheet = Sheet([
+    { "amount": "600,21", "description": "test 1" },
+    { "amount": -14.6,    "description": "test 2" },
+    { "amount": 1000000,  "description": "test 3" },
+  ])
+  rules = {
+    "amount" : [ positive_green, negative_red ],
+    "balance": [ negative_red ]
+  }
+  for table in [ Tabular(sheet.balanced, colorize=rules), Tabular(Sheet()) ]:
+    streamed = StringIO()
+    table.stream(streamed, page=1)
+    assert streamed.getvalue() == str(table) + "\n"
+
+@freeze_time("Jan 14th, 2012", auto_tick_seconds=24*3600)
+def test_table_windows(monkeypatch):
+  monkeypatch.setattr(fintrack.utils.uuid, "uuid4", Mock(side_effect=["1", "2", "3", "4"]))
+
+  sheet = Sheet([
+    { "amount": 1, "description": "test 1" },
+    { "amount": 2, "description": "test 2" },
+    { "amount": 3, "description": "test 3" },
+    { "amount": 4, "description": "test 4" }
+  ])
+  assert [ row[2] for row in Tabular(sheet.balanced, head=2).rows ] == [ 1, 3 ]
+  assert [ row[2] for row in Tabular(sheet.balanced, tail=2).rows ] == [ 6, 10 ]
+  assert [ row[2] for row in Tabular(sheet.balanced, offset=1, head=2).rows ] == [ 3, 6 ]
+  assert [ row[1] for row in Tabular(sheet, offset=1, head=2).rows ] == [ 2, 3 ]
+
+  streamed = StringIO()
+  Tabular(sheet, tail=1).stream(streamed, sample=1)
+  assert streamed.getvalue().count("test") == 1
+
+@freeze_time("Jan 14th, 2012", auto_tick_seconds=24*3600)
+def test_values_beyond_the_sample_that_arent_numbers(monkeypatch):
+  monkeypatch.setattr(fintrack.utils.uuid, "uuid4", Mock(side_effect=["1", "2", "e3"]))
+
+  sheet = Sheet([
+    { "amount": 1, "description": "test 1" },
+    { "amount": 2, "description": "test 2" },
+    { "amount": 3, "description": "test 3" }
+  ])
+  streamed = StringIO()
+  Tabular(sheet).stream(streamed, sample=2)
+  lines = streamed.getvalue().splitlines()
+  assert lines[3].endswith("|     1 |")
+  assert lines[7].endswith("| e3    |")
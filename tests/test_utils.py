@@ -0,0 +1,92 @@
+from freezegun import freeze_time
+from datetime import datetime, timedelta
+
+import json
+import pytest
+
+from io import StringIO
+
+import dateparser
+from dateparser import parse
+
+import fintrack.utils
+from fintrack.utils import parse_datetime, fast_parse_datetime, parse_cache_info
+from fintrack.utils import asrow, asrows, rawrow, row_getter
+from fintrack.utils import iterdecode, ClassEncoder, ClassDecoder
+
+from fintrack.records import Record
+from fintrack.plans   import PlannedRecord
+
+def test_fast_datetime_parsing_matches_dateparser():
+  today = datetime.now().date()
+  for dt_str in [
+    "7/6", "7/6/19", "7/6/2019", "07/06/2019", "7-6-2019", "7.6.2019",
+    "31/12/99", "1/1/69", "1/1/68", "8/6 12:00", "8/6 12:00:13", "7/6/19 8:05",
+    "2019-07-06", "2019/07/06", "2019-07-06 10:20", "2019-07-06T10:20:30",
+    "2025-06-11T10:27:44.518314"
+  ]:
+    expected = parse(dt_str, settings={"DATE_ORDER": fintrack.utils.DATE_ORDER})
+    assert fast_parse_datetime(dt_str, today) == expected, dt_str
+
+def test_fast_datetime_parsing_leaves_others_to_dateparser():
+  today = datetime.now().date()
+  for dt_str in [ "13/13", "7/6-2019", "Thu, 1 May 2025", "next month" ]:
+    assert fast_parse_datetime(dt_str, today) is None, dt_str
+  assert parse_datetime("13/13") == datetime(2013, 10, 13)
+
+def test_datetime_parsing_is_cached():
+  parse_datetime("Sun, 11 May 2025")
+  before = parse_cache_info()
+  assert parse_datetime("Sun, 11 May 2025") == datetime(2025, 5, 11)
+  after = parse_cache_info()
+  assert after.hits == before.hits + 1
+  assert after.misses == before.misses
+
+def test_relative_datetime_parsing_is_cached_per_day(monkeypatch):
+  with freeze_time("Jan 14th, 2012 10:00"):
+    assert parse_datetime("tomorrow") == datetime(2012, 1, 15)
+  with freeze_time("Jan 20th, 2012 10:00") as frozen:
+    assert parse_datetime("tomorrow") == datetime(2012, 1, 21)
+    assert parse_datetime("next month") == datetime(2012, 2, 20)
+    frozen.tick(timedelta(hours=2))
+    monkeypatch.setattr(dateparser, "parse", lambda *args, **kwargs: pytest.fail("parsed"))
+    assert parse_datetime("next month") == datetime(2012, 2, 20)
+
+def test_datetime_parsing_relative_to_the_time_is_not_cached():
+  with freeze_time("Jan 14th, 2012 10:00") as frozen:
+    assert parse_datetime("now") == datetime(2012, 1, 14, 10, 0)
+    assert parse_datetime("in 2 seconds") == datetime(2012, 1, 14, 10, 0, 2)
+    frozen.tick(timedelta(seconds=5))
+    assert parse_datetime("now") == datetime(2012, 1, 14, 10, 0, 5)
+    assert parse_datetime("in 2 seconds") == datetime(2012, 1, 14, 10, 0, 7)
+
+def test_rows_are_extracted_per_class():
+  record  = Record("1,5", "coffee", "1/1/2020", "1")
+  planned = PlannedRecord("-10", "rent", "every month on the 1st", [], "2")
+  assert rawrow(record) == [ datetime(2020, 1, 1), record.amount, "coffee", "1" ]
+  assert rawrow(planned) == [ "every month on the 1st", planned.amount, "rent", [], "2" ]
+  assert asrow(record)[1:] == [ 1.5, "coffee", "1" ]
+  assert list(asrows([ record, planned, { "a" : 1 } ])) == [
+    asrow(record), asrow(planned), [ 1 ]
+  ]
+  assert row_getter(Record) is row_getter(Record)
+  assert row_getter(dict) is None
+  assert asrow(object()) is None
+
+def test_json_arrays_are_decoded_one_object_at_a_time():
+  records = [
+    Record(index, f"test \"{index}\"", datetime(2025, 1, 1) + timedelta(hours=index))
+    for index in range(50)
+  ]
+  for indent in [ None, 2 ]:
+    text = json.dumps(records, cls=ClassEncoder, indent=indent)
+    for chunk in [ 1, 7, 4096 ]:
+      decoded = iterdecode(StringIO(text), Record, chunk=chunk)
+      assert next(decoded) == records[0]
+      assert [ records[0], *decoded ] == json.loads(text, cls=ClassDecoder(Record))
+  assert list(iterdecode(StringIO(" [ ] "), Record)) == []
+
+def test_invalid_json_arrays_are_refused():
+  for text in [ "", "not json", "{}", "[", '[{"amount": "1"', "[1, 2 3]" ]:
+    with pytest.raises(json.JSONDecodeError):
+      list(iterdecode(StringIO(text), Record, chunk=2))